@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import re
+import glob
+import numpy     as np
 import pandas    as pd
 import itertools as it
+from concurrent.futures import ProcessPoolExecutor
 
 
 identifiers = ["ID", "Depth", "Skinlatency", "DR threshold test", "Note1", "Note2", "Note3", "Note4", "Note5"]
 inputs      = ["Skin", "Ia", "Ib" ,"II" ,"Pyr"]
 outputs     = ["aMN", "LRN"]
 
+output_suffixes = {'weight': '_tidy_weight.csv', 'noweight': '_tidy_noweight.csv'}
+
 usage = \
 """Usage:
-convert_data.py data.csv output_data.csv [weight|noweight]"""
+convert_data.py data.csv output_data.csv [weight|noweight]
+convert_data.py --batch data_directory|"data_*.csv" [n_processes]"""
 
 def tuple_to_string(t):
     return str(t[0]) + str(t[1])    
@@ -22,63 +28,114 @@ def inputs_lengths(inputs):
     cross = it.product(inputs, lengths)
     return list(map(tuple_to_string, cross))
 
-def data_to_list(raw, datatype):
-    raw = str(raw)
-    if raw == '-' or raw == '' or raw == 'nan':
-        return []
-    f = int if datatype == 'int' else lambda x: int(10*float(x))
-    return list(map(f, filter(lambda x: len(x) > 0, re.split(';|:', raw))))
+def data_to_frame(raw, datatype):
+    raw = raw.astype(object).fillna('nan').astype(str)
+    raw = raw[~raw.isin(['-', '', 'nan'])]
+
+    values = raw.str.split(';|:', regex = True).explode()
+    values = values[values.str.len() > 0]
+
+    if datatype == 'int':
+        values = values.astype(np.int64)
+    else:
+        values = (10 * values.astype(np.float64)).astype(np.int64)
+
+    frame = pd.DataFrame({'row': values.index.to_numpy(), 'value': values.to_numpy()})
+    frame['position'] = frame.groupby('row').cumcount()
+    return frame
 
 def convert_data(data, weight_conversion = None):
-    columns_syn =   inputs_lengths(inputs) + inputs_lengths(outputs)
-    tidy_data = pd.DataFrame(columns = identifiers + columns_syn)
-
-    for idx, rows in data.groupby(data.index // 2):
-        syn    = rows.iloc[0]
-        weight = rows.iloc[1]
-        
-        tidy_row = {}
-        
-        print(columns_syn)
-        for c in columns_syn:
-            tidy_row[c] = 0
-            
-        for i in inputs:
-            isyn    = data_to_list(syn[i],    'int')
-            iweight = data_to_list(weight[i], 'float')
-
-            if len(isyn) < len(iweight):
-                print("Less input lengths then weights")
-                assert(False)
-
-            for s, w in zip(isyn, iweight + len(isyn) * [None]):
-                if weight_conversion == 'weight':
-                    tidy_row[tuple_to_string((i, s))] = w
-                elif weight_conversion == 'noweight':
-                    tidy_row[tuple_to_string((i, s))] = 1                    
-                else:
-                    print(usage)
-                    print('Specify weight/noweight')
-        
-        for i in identifiers:
-            tidy_row[i] = syn[i]
-
-        tidy_data = tidy_data.append(tidy_row, ignore_index = True)
+    columns_syn = inputs_lengths(inputs) + inputs_lengths(outputs)
+
+    syn    = data.iloc[0::2].reset_index(drop = True)
+    weight = data.iloc[1::2].reset_index(drop = True)
+
+    if weight_conversion not in ['weight', 'noweight']:
+        print(usage)
+        print('Specify weight/noweight')
+
+    dtype = np.float64 if weight_conversion == 'weight' else np.int64
+    tidy_syn = np.zeros((len(syn), len(columns_syn)), dtype = dtype)
+
+    for i in inputs:
+        isyn    = data_to_frame(syn[i],    'int')
+        iweight = data_to_frame(weight[i], 'float')
+
+        n_weight = iweight.groupby('row').size()
+        n_syn    = isyn.groupby('row').size().reindex(n_weight.index, fill_value = 0)
+        if (n_syn < n_weight).any():
+            print("Less input lengths then weights")
+            assert(False)
+
+        cells = isyn.merge(iweight, on = ['row', 'position'], how = 'left', suffixes = ('', '_weight'))
+        if (cells.value.abs() > 4).any():
+            print("Synaptic length out of range")
+            assert(False)
+        cells['column'] = columns_syn.index(tuple_to_string((i, -4))) + cells.value + 4
+        cells = cells.drop_duplicates(['row', 'column'], keep = 'last')
+
+        rows    = cells.row.to_numpy()
+        columns = cells.column.to_numpy()
+        if weight_conversion == 'weight':
+            tidy_syn[rows, columns] = cells.value_weight.to_numpy(dtype = np.float64, na_value = np.nan)
+        elif weight_conversion == 'noweight':
+            tidy_syn[rows, columns] = 1
+
+    tidy_syn = pd.DataFrame(tidy_syn, columns = columns_syn)
+    if weight_conversion == 'weight':
+        tidy_syn = tidy_syn.astype('Int64')
+
+    return pd.concat([syn[identifiers], tidy_syn], axis = 1)
+
+def convert_file(input_filename, output_filename, weight_conversion):
+    data = pd.read_csv(input_filename, encoding = 'utf8')
 
+    tidy_data = convert_data(data, weight_conversion = weight_conversion)
+    tidy_data.to_csv(output_filename)
     return tidy_data
 
+def convert_job(job):
+    convert_file(*job)
+    return job
+
+def batch_jobs(sheets):
+    if os.path.isdir(sheets):
+        sheets = os.path.join(sheets, '*.csv')
+
+    jobs = []
+    for input_filename in sorted(glob.glob(sheets)):
+        if '_tidy' in os.path.basename(input_filename):
+            continue
+        for weight_conversion, suffix in output_suffixes.items():
+            output_filename = os.path.splitext(input_filename)[0] + suffix
+            if os.path.exists(output_filename) and \
+               os.path.getmtime(output_filename) > os.path.getmtime(input_filename):
+                print('Up to date', output_filename)
+                continue
+            jobs.append((input_filename, output_filename, weight_conversion))
+    return jobs
+
+def convert_batch(sheets, n_processes = None):
+    jobs = batch_jobs(sheets)
+    with ProcessPoolExecutor(max_workers = n_processes) as pool:
+        for input_filename, output_filename, _ in pool.map(convert_job, jobs):
+            print('Converted', input_filename, '->', output_filename)
+    return jobs
+
 def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == '--batch':
+        n_processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        convert_batch(sys.argv[2], n_processes)
+        return
+
     if len(sys.argv) <= 3:
         print(usage)
         return
 
     input_filename  = sys.argv[1]
     output_filename = sys.argv[2]
-    
-    data = pd.read_csv(input_filename, encoding = 'utf8')
 
-    tidy_data = convert_data(data, weight_conversion = sys.argv[3])
-    tidy_data.to_csv(output_filename)
+    tidy_data = convert_file(input_filename, output_filename, sys.argv[3])
 
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
         print(tidy_data)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import sys
+import numpy  as np
+import pandas as pd
+
+from rule_tables import open_rules
+from synaptology import load_synaptology
+
+usage = \
+"""Usage:
+cooccurrence.py data_tidy.csv [AssociationRules.csv]
+
+Prints support and confidence of the association rules between all activations
+of data_tidy.csv. With a result table of analysis_core the confidences are
+compared to its original values."""
+
+#Support and confidence of the association rules between activations, the
+#statistics of NeuronSet::lhs_support and NeuronSet::confidence. For a 0/1
+#neuron x activation matrix X the co-occurrence counts of all pairs of
+#activations are XᵀX, its diagonal holds the counts of the single activations:
+#support(a)       = count(a) / neurons
+#confidence(l, r) = count(l and r) / count(l)
+#Nonzero weights count as activations. All functions also take a stack of
+#matrices along leading axes (e.g. the samples of swap_randomization.run_chains)
+#and return the result for every matrix, the products run as one batched matmul.
+
+#Largest count float32 holds exactly.
+float32_limit = 2 ** 24
+
+
+def activations(matrices):
+    matrices = np.asarray(matrices)
+    dtype = np.float32 if matrices.shape[-2] <= float32_limit else np.float64
+    return (matrices != 0).astype(dtype)
+
+
+#Co-occurrence counts with shape (..., activations, activations).
+def cooccurrence(matrices):
+    X = activations(matrices)
+    return np.matmul(np.swapaxes(X, -1, -2), X)
+
+
+def support(matrices):
+    matrices = np.asarray(matrices)
+    return np.count_nonzero(matrices, axis = -2) / matrices.shape[-2]
+
+
+#Confidence of the rule l => r at [..., l, r]. Rules of activations that never
+#occur are nan.
+def confidence(matrices):
+    counts = cooccurrence(matrices).astype(np.float64)
+    lhs = np.diagonal(counts, axis1 = -2, axis2 = -1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return counts / lhs[..., :, np.newaxis]
+
+
+#All rules of one matrix in the order of NeuronSet::all_rules.
+def association_rules(columns, matrix):
+    n = len(columns)
+    return pd.DataFrame({'l':          np.repeat(columns, n),
+                         'r':          np.tile(columns, n),
+                         'support':    np.repeat(support(matrix), n),
+                         'confidence': confidence(matrix).ravel()})
+
+
+#Original values of the rules of an analysis_core result table.
+def original_values(filename):
+    rules = open_rules(filename)
+    values = {}
+    for rule in rules.rules():
+        table = rules[rule]
+        values[rule] = table[table.original == 'T'].Value.iloc[0]
+    return values
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(usage)
+        return
+
+    data = load_synaptology(sys.argv[1])
+    columns, matrix = data.select()
+    rules = association_rules(columns, matrix)
+
+    if len(sys.argv) > 2:
+        originals = original_values(sys.argv[2])
+        rules['original'] = [originals.get((l, r), np.nan) for l, r in zip(rules.l, rules.r)]
+        compared = rules.original.notna()
+        difference = np.abs(rules.confidence - rules.original)[compared]
+        print(compared.sum(), 'rules compared, largest difference', difference.max())
+
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(rules)
+
+
+if __name__ == "__main__":
+    main()
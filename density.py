@@ -0,0 +1,134 @@
+import numpy as np
+from scipy.signal import fftconvolve
+
+#Gaussian kernel density estimates on a regular grid. The samples are linearly
+#binned onto the grid and the bin counts are convolved with the kernel by FFT,
+#so the cost depends on the grid size and not on the number of samples.
+#bw is the scaling factor of the sample covariance like bw_method of
+#scipy.stats.gaussian_kde (and bw of sns.kdeplot), None uses Scott's rule.
+#The grid reaches cut bandwidths beyond the data and is limited to clip.
+#Non-finite samples are dropped. Without two samples spanning every dimension
+#there is no estimate, the grids and the density are returned empty then.
+
+gridsize = 200
+cut      = 3
+
+#Kernel reaches this many bandwidths from its center.
+kernel_extent = 4
+
+
+#Finite samples as a (dimensions, n) array or None if they do not span all dimensions.
+def finite_samples(*samples):
+    samples = np.vstack([np.asarray(s, dtype = np.float64) for s in samples])
+    samples = samples[:, np.isfinite(samples).all(axis = 0)]
+    if samples.shape[1] < 2 or np.linalg.matrix_rank(np.atleast_2d(np.cov(samples))) < len(samples):
+        print('Not enough distinct samples for a density estimate')
+        return None
+    return samples
+
+
+def covariance(samples, bw):
+    d, n = samples.shape
+    factor = n ** (-1.0 / (d + 4)) if bw is None else bw
+    return np.atleast_2d(np.cov(samples)) * factor ** 2
+
+
+def support_grid(x, bandwidth, clip, size):
+    low  = x.min() - cut * bandwidth
+    high = x.max() + cut * bandwidth
+    if clip is not None:
+        low  = max(low, clip[0])
+        high = min(high, clip[1])
+    return np.linspace(low, high, size)
+
+
+#Grid covering the data and the kernel, the estimate is computed on it and then
+#interpolated to the support grid, so samples outside of clip still count.
+def binning_grid(x, bandwidth, support, size):
+    low  = min(support[0], x.min() - kernel_extent * bandwidth)
+    high = max(support[-1], x.max() + kernel_extent * bandwidth)
+    step = (support[-1] - support[0]) / (len(support) - 1) if support[-1] > support[0] else bandwidth / 10
+    return np.arange(low, high + step, step)
+
+
+#Position of x on a regular grid as index of the left grid point and weight of the right one.
+def grid_position(x, grid):
+    step = grid[1] - grid[0]
+    position = np.clip((x - grid[0]) / step, 0, len(grid) - 1 - 1e-9)
+    left = np.floor(position).astype(np.int64)
+    return left, position - left
+
+
+def kernel_offsets(bandwidth, step):
+    m = int(np.ceil(kernel_extent * bandwidth / step))
+    return np.arange(-m, m + 1) * step
+
+
+def kde_1d(x, bw = None, clip = None, size = gridsize):
+    samples = finite_samples(x)
+    if samples is None:
+        return np.zeros(0), np.zeros(0)
+
+    x = samples[0]
+    bandwidth = np.sqrt(covariance(x[np.newaxis], bw)[0, 0])
+
+    support = support_grid(x, bandwidth, clip, size)
+    grid = binning_grid(x, bandwidth, support, size)
+    step = grid[1] - grid[0]
+
+    left, right = grid_position(x, grid)
+    counts = np.bincount(left, 1 - right, len(grid)) + np.bincount(left + 1, right, len(grid) + 1)[:len(grid)]
+
+    offsets = kernel_offsets(bandwidth, step)
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    kernel /= kernel.sum() * step
+
+    density = fftconvolve(counts / len(x), kernel, mode = 'same')
+    return support, np.interp(support, grid, np.maximum(density, 0))
+
+
+#Returns the x and y support grids and the density with shape (len(y), len(x))
+#like the arguments of contour and contourf.
+def kde_2d(x, y, bw = None, clip = None, size = gridsize):
+    samples = finite_samples(x, y)
+    if samples is None:
+        return np.zeros(0), np.zeros(0), np.zeros((0, 0))
+
+    x, y = samples
+    cov = covariance(samples, bw)
+    bandwidth = np.sqrt(np.diag(cov))
+    clip = (None, None) if clip is None else clip
+
+    supports = [support_grid(v, b, c, size) for v, b, c in zip([x, y], bandwidth, clip)]
+    grids = [binning_grid(v, b, s, size) for v, b, s in zip([x, y], bandwidth, supports)]
+    steps = [g[1] - g[0] for g in grids]
+    shape = (len(grids[1]), len(grids[0]))
+
+    (xl, xr), (yl, yr) = grid_position(x, grids[0]), grid_position(y, grids[1])
+    counts = np.zeros(shape[0] * shape[1])
+    for dy, wy in [(0, 1 - yr), (1, yr)]:
+        for dx, wx in [(0, 1 - xr), (1, xr)]:
+            cells = np.minimum(yl + dy, shape[0] - 1) * shape[1] + np.minimum(xl + dx, shape[1] - 1)
+            counts += np.bincount(cells, wy * wx, len(counts))
+    counts = counts.reshape(shape)
+
+    ox, oy = np.meshgrid(kernel_offsets(bandwidth[0], steps[0]), kernel_offsets(bandwidth[1], steps[1]))
+    d = np.stack([ox, oy], axis = -1)
+    kernel = np.exp(-0.5 * np.einsum('...i,ij,...j->...', d, np.linalg.inv(cov), d))
+    kernel /= kernel.sum() * steps[0] * steps[1]
+
+    density = np.maximum(fftconvolve(counts / len(x), kernel, mode = 'same'), 0)
+
+    #Interpolate rows to the x support, then columns to the y support.
+    density = np.array([np.interp(supports[0], grids[0], row) for row in density])
+    density = np.array([np.interp(supports[1], grids[1], column) for column in density.T]).T
+    return supports[0], supports[1], density
+
+
+#Density values enclosing the given proportions of the probability mass, the
+#contour levels of sns.kdeplot. Areas below the lowest level stay empty.
+def isoproportion_levels(density, levels = 10, thresh = 0.05):
+    proportions = np.linspace(thresh, 1, levels)
+    values = np.sort(np.ravel(density))[::-1]
+    mass = np.cumsum(values) / values.sum()
+    return values.take(np.searchsorted(mass, 1 - proportions), mode = 'clip')
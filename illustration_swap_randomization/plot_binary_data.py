@@ -5,9 +5,13 @@ import matplotlib.pyplot as plt
 import matplotlib.colors
 import pandas as pd
 import sys
+import os
 
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import swap_randomization
+
 sides = ['top', 'right', 'bottom', 'left']
 
 def hide_spines(ax):
@@ -27,9 +31,23 @@ def plot_table(data, ax):
     ax.set_xticks([])
     return ax
 
-usage = """plot_binary_data.py Input.csv Output"""
+usage = """plot_binary_data.py Input.csv Output [--swaps n_swaps [seed]]
+
+With --swaps the data is swap randomized n_swaps times before plotting."""
 
 def main():
+    swaps = None
+    if '--swaps' in sys.argv:
+        i = sys.argv.index('--swaps')
+        options = sys.argv[i + 1:]
+        del sys.argv[i:]
+        try:
+            swaps = int(options[0])
+            seed = int(options[1]) if len(options) > 1 else None
+        except:
+            print(usage)
+            return
+
     try:
         data_file = sys.argv[1]
         if len(sys.argv) < 3:
@@ -43,6 +61,9 @@ def main():
     data = pd.read_csv(data_file, encoding = 'utf8')
     data = data.drop(['ID'], axis = 1)
 
+    if swaps is not None:
+        data[:] = swap_randomization.swap_examples(data.values, 1, swaps, seed)[0].astype(int)
+
     fig, ax = plt.subplots()
     plot_table(data, ax)
     plt.savefig(plot_file, transparacy = True, bbox_inches='tight', dpi = 300)
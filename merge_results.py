@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import glob
+import numpy  as np
+import pandas as pd
+
+import rule_tables
+from significance import rule_statistics
+
+usage = \
+"""Usage:
+merge_results.py output_directory result_directory [result_directory ...]
+
+Merges the result tables (ExIn.csv, AssociationRules.csv, ...) of independent
+analysis_core runs, every table is merged over the directories containing it."""
+
+
+#Sums the frequencies of every (rule, value) over the shards. Rules keep the
+#order of their first appearance, values are sorted like in analysis_core.
+def merge_tables(tables):
+    table = pd.concat(tables, ignore_index = True)
+
+    originals = table[table.original == 'T'].groupby(['l', 'r'], sort = False).Value.unique()
+    for (l, r), values in originals.items():
+        if len(values) > 1:
+            print('Original values disagree for', l, '=>', r, values)
+            assert(False)
+
+    rule_codes, _ = pd.factorize(pd.MultiIndex.from_arrays([table.l, table.r]))
+    table['rule'] = rule_codes
+    merged = table.groupby(['rule', 'Value'], sort = True).agg(l = ('l', 'first'), r = ('r', 'first'), freq = ('freq', 'sum'))
+    merged = merged.reset_index()
+
+    original = pd.Series(originals.map(lambda v: v[0]))
+    original_rows = pd.MultiIndex.from_arrays([merged.l, merged.r]).map(lambda k: original.get(k, np.nan))
+    merged['original'] = np.where(merged.Value.to_numpy() == np.asarray(original_rows, dtype = np.float64), 'T', 'F')
+    merged['Value'] = merged.Value.astype(table.Value.dtype)
+
+    missing = set(zip(merged.l, merged.r)) - set(original.index)
+    for l, r in sorted(missing):
+        print('No original value for', l, '=>', r, 'p = nan')
+
+    #p-values like frequency_counter::get_p on the merged frequencies.
+    merged['Name'] = ''
+    merged['p'] = np.nan
+    rules = rule_tables.RuleTable(merged[['Name', 'Value', 'freq', 'original', 'l', 'r', 'p']])
+    statistics = rule_statistics({'merged': rules})
+    p = np.repeat(statistics.core.to_numpy(), [s.stop - s.start for s in rules.index.values()])
+
+    merged = rules.table
+    merged['p'] = p
+    merged['Name'] = rule_tables.format_names(merged.l, merged.r, p)
+    return merged
+
+
+def merge_directories(output, directories):
+    names = sorted(set(os.path.basename(f) for d in directories for f in glob.glob(os.path.join(d, '*.csv'))))
+
+    os.makedirs(output, exist_ok = True)
+    for name in names:
+        filenames = [os.path.join(d, name) for d in directories if os.path.exists(os.path.join(d, name))]
+        merged = merge_tables([rule_tables.read_table(f) for f in filenames])
+        rule_tables.write_table(os.path.join(output, name), merged)
+        print(name, len(filenames), 'shards', merged.freq.sum(), 'samples')
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(usage)
+        return
+
+    merge_directories(sys.argv[1], sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,14 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-import re
-import pandas as pd
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+import matplotlib.transforms as transforms
+from matplotlib.patches import Rectangle
+from matplotlib.collections import LineCollection, PatchCollection
+
+import render
+import cooccurrence
+from rule_tables import open_rules
+from synaptology import load_synaptology
 
 
 significance_level = 1 - ((1 - 0.05) ** (1 / 30))
@@ -17,82 +22,38 @@ bg_green = (0, 1, 94 / 255, 0.5)
 bg_red = (1, 0, 0, 140 / 255)
 bg_grey = (0, 0, 0, 0.1)
 
+#Upper limit of the freq axis of each rule and offset of the rules from the grid in points.
+freq_limit   = 3000000
+cell_padding = 5
+
 sides = ['top', 'right', 'bottom', 'left']
 def hide_spines(ax):
     for s in sides:
         ax.spines[s].set_visible(False)
 
 
-def set_spine_color(ax, color):
-    for s in sides:
-        ax.spines[s].set_color(color)
-
-
-def set_spine_width(ax, lw):
-    for s in sides:
-        ax.spines[s].set_linewidth(lw)
-
-
-def match(s):
-    m = re.search('(.*) => (.*) p = ([0-9]*.[0-9]*)', s)
-    return [m.group(1), m.group(2), m.group(3)]
-
+#Sorted so that transactions with the same support keep the same order in every run.
+def get_transactions(rules):
+    return sorted(rules.lhs())
 
-def fixTable(table):
-    table = table.loc[lambda r: r.Name != "Name", :]
-    cols = table.apply(lambda r: pd.Series(match(r.Name), index = ['l', 'r', 'p']), axis = 1)
-    table = table.join(cols)
-    table.Value = pd.to_numeric(table.Value)
-    table.freq = pd.to_numeric(table.freq)
-    table.p = pd.to_numeric(table.p)
-    return table
 
-
-def get_transactions(table):
-    return set(table.l)
-
-
-def plot_table(table, ax):
+#Background and spine color of a rule. Rules with a significantly lower value
+#than the swap randomized data are red, with a higher one green.
+def rule_colors(table):
     p = table.p.iloc[0]
     original = table[table.original == 'T'].Value.iloc[0]
 
-    ax.set_xlim([0.0, 1.0])
-    ax.set_ylim([0, 3000000])
-    ax.set_xticks([])
-    ax.set_yticks([])
-    ax.set_yticklabels([])
-    ax.set_xticklabels([])
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    set_spine_width(ax, 1.5)
-
     if p <= significance_level and original < table.Value.mean():
-        ax.set_facecolor(bg_red)
-        set_spine_color(ax, 'red')        
-        ax.plot(table.Value, table.freq, color = 'black')        
-        ax.axvline(x = original, color = 'grey')
+        return bg_red, 'red'
     elif p <= significance_level and original > table.Value.mean():
-        ax.set_facecolor(bg_green)
-        set_spine_color(ax, 'green')
-        ax.plot(table.Value, table.freq, color = 'black')
-        ax.axvline(x = original, color = 'grey')
+        return bg_green, 'green'
     else:
-        ax.set_facecolor(bg_grey)        
-        ax.plot(table.Value, table.freq, color = 'black')
-        ax.axvline(x = original, color = 'grey') 
-    
-    total = table.freq.sum()
-    smaller = table[table.Value < original].freq.sum()
-    larger  = table[table.Value > original].freq.sum()
-
-    return ax
+        return bg_grey, 'black'
 
 
 def get_support(transactions, data):
-    support = {}
-    for t in transactions:
-        support[t] = data[t].sum() / data.shape[0]
-    return support
+    values = data.values([data.column_index[t] for t in transactions])
+    return dict(zip(transactions, cooccurrence.support(values)))
 
 
 def plot_association_rules(rules, data):
@@ -117,16 +78,41 @@ def plot_association_rules(rules, data):
 
     hide_spines(composition)
 
-    height = width = str((100 / n_transactions) - 2) + "%"
-
+    #Every rule gets a cell of the composition axes, Value 0 to 1 and freq 0 to
+    #freq_limit are scaled to the cell. The cells are shifted by cell_padding points
+    #from the grid corner through the offset transform shared by all collections.
+    size = 1 - 0.02 * n_transactions
+    cell_transform = composition.transData + \
+        transforms.ScaledTranslation(cell_padding / 72, cell_padding / 72, composition_fig.dpi_scale_trans)
+
+    backgrounds  = []
+    spines       = []
+    spine_colors = []
+    curves       = []
+    originals    = []
     for l, i in zip(transactions, range(n_transactions)):
         for r, j in zip(transactions, range(n_transactions)):
             if l == r:
                 continue
-            table = rules[(rules.l == l) & (rules.r == r)]
-            inset = inset_axes(composition, width=width, height = height, loc = 3, bbox_to_anchor=[i / n_transactions, j / n_transactions, 1, 1], 
-                               bbox_transform = composition.transAxes)
-            plot_table(table, inset)
+            table = rules[l, r]
+            background, spine_color = rule_colors(table)
+            original = table[table.original == 'T'].Value.iloc[0]
+
+            backgrounds.append(Rectangle((i, j), size, size, facecolor = background))
+            spines.append([(i, j + size), (i, j), (i + size, j)])
+            spine_colors.append(spine_color)
+            curves.append(np.column_stack([i + np.clip(table.Value.to_numpy(), 0, 1) * size,
+                                           j + np.clip(table.freq.to_numpy() / freq_limit, 0, 1) * size]))
+            originals.append([(i + original * size, j), (i + original * size, j + size)])
+
+    collections = [PatchCollection(backgrounds, match_original = True, linewidth = 0, zorder = 1),
+                   LineCollection(curves, colors = 'black', linewidths = 1.5, zorder = 2),
+                   LineCollection(originals, colors = 'grey', linewidths = 1.5, zorder = 2),
+                   LineCollection(spines, colors = spine_colors, linewidths = 1.5, zorder = 3)]
+    for c in collections:
+        c.set_transform(cell_transform)
+        c.set_clip_on(False)
+        composition.add_collection(c, autolim = False)
 
 
     composition_fig.set_figheight(2.8)
@@ -134,16 +120,19 @@ def plot_association_rules(rules, data):
     composition_fig.savefig('./plots_association_rules/AssociationRuleMatrix.pdf', dpi = 500)
 
 
-def main():
+def figure_jobs():
     rule_file = "./results_association_rules/AssociationRules.csv"
     data_file  = "./data_synaptology/Synaptology_tidy_reduced.csv"
 
-    data  = pd.read_csv(data_file, encoding = 'utf8')
-    rules = pd.read_csv(rule_file, encoding = 'utf8')
-    rules = fixTable(rules)
+    data  = load_synaptology(data_file)
+    rules = open_rules(rule_file)
 
+    return [render.job('./plots_association_rules/AssociationRuleMatrix.pdf', plot_association_rules, rules, data)]
 
-    plot_association_rules(rules, data)
+
+def main():
+    import plot_association_rules
+    render.exit_if_failed(render.render(plot_association_rules.figure_jobs()))
 
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@ import seaborn as sns
 import numpy as np
 
 import plot_style
+import render
 
 
 def config_fig_ax(fig, ax, width, height):
@@ -16,9 +17,8 @@ def config_fig_ax(fig, ax, width, height):
     fig.tight_layout()
 
 
-def plot_SigClust(width, height, filename):
+def plot_SigClust(data, width, height, filename):
     fig, ax = plt.subplots()
-    data = pd.read_csv('results_clusterability/SigClust_Result_1.csv', encoding = 'utf8')
     sns.distplot(data['CI'], hist = False, color = 'black', ax = ax)
     ax.axvline(0.7140668, color = 'blue')
     ax.set_xlabel('Cluster Index')
@@ -30,9 +30,8 @@ def plot_SigClust(width, height, filename):
     print('Sample average cluster index', np.mean(data['CI']))
     print('Sample standard deviation cluster index', np.std(data['CI']))
 
-def plot_GapStat(width, height, filename):
+def plot_GapStat(data, width, height, filename):
     fig, ax = plt.subplots()
-    data = pd.read_csv('results_clusterability/GapStat_Result.csv', encoding = 'utf8')
     x = data['k']
     y = data['gap']
     ax.plot(x, y, color = 'black')
@@ -43,15 +42,27 @@ def plot_GapStat(width, height, filename):
     fig.savefig('plots_clusterability/' + filename, dpi = 300, transparent = True)
 
 
-def main():
-    plot_SigClust(3, 3, 'Sigclust_1:1.png')
-    plot_GapStat(3, 3, 'GapStatistics_1:1.png')
+def figure_jobs():
+    sigclust = pd.read_csv('results_clusterability/SigClust_Result_1.csv', encoding = 'utf8')
+    gapstat  = pd.read_csv('results_clusterability/GapStat_Result.csv', encoding = 'utf8')
+
+    SigClust = lambda width, height, filename: \
+        render.job('plots_clusterability/' + filename, plot_SigClust, sigclust, width, height, filename)
+    GapStat = lambda width, height, filename: \
+        render.job('plots_clusterability/' + filename, plot_GapStat, gapstat, width, height, filename)
+
+    return [SigClust(3, 3, 'Sigclust_1:1.png'),
+            GapStat(3, 3, 'GapStatistics_1:1.png'),
 
-    plot_SigClust(3, 1.5, 'Sigclust_1:2.png')
-    plot_GapStat(3 * 1.3, 1.5 * 1.3, 'GapStatistics_1:2.png')
+            SigClust(3, 1.5, 'Sigclust_1:2.png'),
+            GapStat(3 * 1.3, 1.5 * 1.3, 'GapStatistics_1:2.png'),
 
+            SigClust(3 * 1.3, 2 * 1.3, 'Sigclust_3:2.png')]
 
-    plot_SigClust(3 * 1.3, 2 * 1.3, 'Sigclust_3:2.png')
+
+def main():
+    import plot_clusterability
+    render.exit_if_failed(render.render(plot_clusterability.figure_jobs()))
 
 if __name__ == "__main__":
     main()
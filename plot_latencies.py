@@ -1,28 +1,37 @@
 #!/usr/bin/env python3
 
+import os
+import sys
 import numpy as np
-import re
-import glob
 import itertools as it
 from collections import defaultdict
+from functools import cached_property
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-import seaborn as sns
 import pandas as pd
 import plot_style
 from scipy.stats import variation
 
-#p = re.compile('[a-zA-Z0-9/\-\_]+/([a-zA-Z0-9]+)\_([a-zA-Z0-9]+)\_([a-zA-Z]+)([0-9]+)\_([\-+][1-4])\_ampl\_([0-9]+)\.dat')
+import density
+import psp_data
+import render
+import resampling
+from synaptology import load_synaptology_index
 
 #Minium latencies per experiment
 #min_latencies = defaultdict(lambda:100.0)
 
 #avg_latencies = defaultdict(list)
 
-p = re.compile('[a-zA-Z0-9/\-\_\.]+/([a-zA-Z0-9]+)\_([a-zA-Z0-9]+)\_([a-zA-Z]+)([0-9]+)\_([\-+][1-4])\_ampl\_([0-9]+)\.dat')
-
 DR_latency_correction = 1.7 #ms
 
+synaptology_filename = "./data_synaptology/Synaptology_HQ_tidy.csv"
+
+plot_directory = "./plots_latencies/"
+
+#Worker processes used to parse data_raw when there is no packed archive.
+n_processes = os.cpu_count()
+
 #Ia_Ib_1_Ex = 2.55 - DR_latency_correction #ms
 #Ia_Ib_2_In = 4.1  - DR_latency_correction #ms
 
@@ -35,126 +44,366 @@ dr_ipsp_latencies   = [0.9]
 dr_epsp_Ia_Ib_seperation = [0.85, 3.5]
 dr_ipsp_Ia_Ib_seperation = [2.4]
 
-def decompose_filename(f):
-    m = p.match(f)
-
-    if m is None:
-        print('No match: ', f)
-        return None
-
-    return {'ID':          m.group(1), 
-            'description': m.group(2).lower(), 
-            'source':      ''.join(sorted(m.group(3).lower())), 
-            'stimulation': int(m.group(4)), 
-            'synaptology': int(m.group(5)), 
-            'amp':         int(m.group(6))}
-
-
-class PSP:
-    def __init__(self, filename, synaptology_table):
-        file_attributes = decompose_filename(filename)
-
-        if file_attributes is None:
-            self.valid = False
-            return
-        else:
-            self.valid = True
-
-        self.filename = filename
-
-        self.ID, \
-        self.description, \
-        self.source, \
-        self.stimulation, \
-        self.synaptology, \
-        self.amp          =  file_attributes.values()
-
-        Skinlatency_table = synaptology_table[synaptology_table.ID == self.ID].Skinlatency
-        self.Skinlatency = next(iter(Skinlatency_table), 101010.0)
-        #print(self.Skinlatency)
-        if(self.Skinlatency > 100):
-            print(self.ID)
-
-        f = np.loadtxt(filename, dtype = float, delimiter = ',')
-
-        if f.shape[1] == 3:
-            f = f[[x[0] > 0 for x in f]]
-            self.latencies = f[:,0]
-            self.amplitude = f[:,1]
-        elif f.shape[1] == 4:
-            f = f[[x[1] > 0 for x in f]]
-            self.latencies = f[:,1]
-            self.amplitude = f[:,2]
-        else:
-            self.valid = False
-            return
-
-        if self.source in ["ikns", "rs", "iklnnsu"]:
-            self.latencies = self.latencies - self.Skinlatency
-        elif self.source in ['dr']:
-            self.latencies = self.latencies - DR_latency_correction
-        else:
-            print('Unknown source')
-
-        self.avg_latency = np.mean(self.latencies)
-        self.var_latency = np.var(self.latencies)
-        self.min_latency = np.min(self.latencies)
-        self.max_latency = np.max(self.latencies)
-
-        self.avg_amplitude = np.mean(self.amplitude)
-        self.var_amplitude = np.var(self.amplitude)
-        self.min_amplitude = np.min(self.amplitude)
-        self.max_amplitude = np.max(self.amplitude)
-
-    def __str__(self):
-        return self.ID + " " + \
-               self.description + " " + \
-               self.source + " " + \
-               str(self.stimulation) + " " + \
-               "syn:" + str(self.synaptology) + " " + \
-               "amp:" + str(self.amp) + " " + \
-               "avg_latency:" + str(self.avg_latency) + " " +\
-               "var_latency:" + str(self.var_latency)
-    
+skin_sources = ["ikns", "rs", "iklnnsu"]
+dr_sources   = ["dr"]
+
+
+#Mean, variance, minimum and maximum of consecutive segments of values.
+#The segments have to cover values in order without gaps.
+def segment_statistics(values, offsets, lengths):
+    means = np.add.reduceat(values, offsets) / lengths
+    deviations = values - np.repeat(means, lengths)
+    variances = np.add.reduceat(deviations * deviations, offsets) / lengths
+    return means, \
+           variances, \
+           np.minimum.reduceat(values, offsets), \
+           np.maximum.reduceat(values, offsets)
+
+
+#One row per PSP trace in traces, the samples of all traces are stored back to
+#back in latencies and amplitude, trace i at offset i with length i.
+#Selecting rows keeps sharing the sample arrays.
+class PSPTable:
+    def __init__(self, traces, latencies, amplitude):
+        self.traces    = traces
+        self.latencies = latencies
+        self.amplitude = amplitude
+
+    def __len__(self):
+        return len(self.traces)
+
+    def __getitem__(self, mask):
+        return PSPTable(self.traces[np.asarray(mask)].reset_index(drop = True), self.latencies, self.amplitude)
+
+    #Pickles only the samples of its own rows, so figure jobs send and fingerprint
+    #the data of their figure and not the shared sample arrays.
+    def __getstate__(self):
+        samples, starts, _ = self.segments()
+        traces = self.traces.copy()
+        traces['offset'] = starts
+        return traces, self.latencies[samples], self.amplitude[samples]
+
+    def __setstate__(self, state):
+        self.traces, self.latencies, self.amplitude = state
+
+    def samples(self, i):
+        offset, length = self.traces.offset[i], self.traces.length[i]
+        return self.latencies[offset:offset + length], self.amplitude[offset:offset + length]
+
+    #Indices of the samples of all rows back to back, the start of each row in
+    #them and the position of every sample within its trace.
+    def segments(self):
+        offsets = self.traces.offset.to_numpy()
+        lengths = self.traces.length.to_numpy()
+        starts  = np.cumsum(lengths) - lengths
+
+        positions = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+        return np.repeat(offsets, lengths) + positions, starts, positions
+
+    def describe(self, i):
+        psp = self.traces.iloc[i]
+        return psp.ID + " " + \
+               psp.description + " " + \
+               psp.source + " " + \
+               str(psp.stimulation) + " " + \
+               "syn:" + str(psp.synaptology) + " " + \
+               "amp:" + str(psp.amp) + " " + \
+               "avg_latency:" + str(psp.avg_latency) + " " +\
+               "var_latency:" + str(psp.var_latency)
+
+
+#Builds the PSP table from the trace index and the concatenated raw samples,
+#corrects the latencies and computes all per trace statistics in one pass.
+def make_PSP_table(index, raw_latencies, amplitude, synaptology):
+    traces = index[index.length > 0].reset_index(drop = True)
+    for f in index.filename[index.length == 0]:
+        print('No responses: ', f)
+
+    traces['Skinlatency'], traces['in_synaptology'] = synaptology.lookup(traces.ID, 'Skinlatency')
+    missing = synaptology.missing(traces.ID)
+    if len(missing) > 0:
+        print('Neurons missing in the synaptology table: ', ' '.join(missing))
+
+    is_skin = traces.source.isin(skin_sources)
+    is_dr   = traces.source.isin(dr_sources)
+    for f in traces.filename[~is_skin & ~is_dr]:
+        print('Unknown source: ', f)
+
+    traces['latency_correction'] = np.where(is_skin, traces.Skinlatency, np.where(is_dr, DR_latency_correction, 0.0))
+
+    offsets = traces.offset.to_numpy()
+    lengths = traces.length.to_numpy()
+    latencies = raw_latencies - np.repeat(traces.latency_correction.to_numpy(), lengths)
+
+    traces['avg_latency'],   \
+    traces['var_latency'],   \
+    traces['min_latency'],   \
+    traces['max_latency']   = segment_statistics(latencies, offsets, lengths)
+
+    traces['avg_amplitude'], \
+    traces['var_amplitude'], \
+    traces['min_amplitude'], \
+    traces['max_amplitude'] = segment_statistics(amplitude, offsets, lengths)
+
+    return PSPTable(traces, latencies, amplitude)
+
+
+def get_PSPs(files, synaptology, n_processes = 1, cache_file = None):
+    if cache_file is None:
+        traces = psp_data.read_traces(files, n_processes)
+    else:
+        traces = psp_data.read_traces_cached(files, n_processes, cache_file)
+
+    index   = []
+    samples = []
+    offset  = 0
+    for f, file_attributes, (latencies, amplitude) in traces:
+        index.append(dict(file_attributes, filename = f, offset = offset, length = len(latencies)))
+        samples.append((latencies, amplitude))
+        offset += len(latencies)
+
+    index = pd.DataFrame(index, columns = psp_data.attributes + ['filename', 'offset', 'length'])
+    latencies = np.concatenate([l for l, _ in samples] + [np.zeros(0)])
+    amplitude = np.concatenate([a for _, a in samples] + [np.zeros(0)])
+    return make_PSP_table(index, latencies, amplitude, synaptology)
+
+def get_archive_PSPs(synaptology, directory = psp_data.archive_directory):
+    index, samples = psp_data.load(directory)
+    return make_PSP_table(index, samples[:, 0], samples[:, 1], synaptology)
+
+#The packed archive is only used while it matches the files in data_raw.
+def load_PSPs(synaptology):
+    files = psp_data.raw_files()
+    if psp_data.archive_exists():
+        if psp_data.archive_is_current(files):
+            return get_archive_PSPs(synaptology)
+        print('The archive in', psp_data.archive_directory, 'is out of date, reading', psp_data.raw_directory,
+              'instead. Run psp_data.py to pack it again.')
+    return get_PSPs(files, synaptology, n_processes, psp_data.cache_file)
+
+#Least squares line over the amplitude sequence, coefficient of variation and
+#residual variance of every trace with at least min_support responses and the
+#given synaptology, computed in closed form over all traces at once.
+def amplitude_drift(psps, min_support = 20, synaptology = 1, max_slope = 0.20, max_cv = 0.30):
+    psps = psps[(psps.traces.length >= min_support) & (psps.traces.synaptology == synaptology)]
+    traces = psps.traces.copy()
+
+    samples, starts, x = psps.segments()
+    y = psps.amplitude[samples]
+    n = traces.length.to_numpy().astype(np.float64)
+
+    y_mean = np.add.reduceat(y, starts) / n
+    xy_sum = np.add.reduceat(x * y, starts)
+    x_mean = (n - 1) / 2
+    x_var  = (n * n - 1) / 12
+
+    slope     = (xy_sum / n - x_mean * y_mean) / x_var
+    intercept = y_mean - slope * x_mean
+
+    residuals = y - np.repeat(intercept, traces.length) - np.repeat(slope, traces.length) * x
+    traces['slope']             = slope
+    traces['intercept']         = intercept
+    traces['residual_variance'] = np.add.reduceat(residuals * residuals, starts) / n
+    traces['cv']                = np.sqrt(traces.var_amplitude) / traces.avg_amplitude
+    traces['excessive_slope']   = traces.slope > max_slope
+    traces['excessive_cv']      = traces.cv > max_cv
+
+    return PSPTable(traces, psps.latencies, psps.amplitude)
+
+#Ia/Ib class counts of the DR PSPs for every pair of EPSP and IPSP separation
+#latencies. The average latencies are sorted once, the class boundaries of all
+#grid points are found with one searchsorted each. The rows of a class are a
+#prefix or range of the returned sort orders, e.g. the Ia mono EPSPs of a grid
+#point are epsp_order[:Ia_mono_epsps].
+def latency_threshold_sweep(session, epsp_separations, ipsp_separations, epsp_upper = dr_epsp_latencies[0]):
+    epsp_order = np.argsort(session.dr_epsps.traces.avg_latency.to_numpy(), kind = 'stable')
+    ipsp_order = np.argsort(session.dr_ipsps.traces.avg_latency.to_numpy(), kind = 'stable')
+    epsp_latencies = session.dr_epsps.traces.avg_latency.to_numpy()[epsp_order]
+    ipsp_latencies = session.dr_ipsps.traces.avg_latency.to_numpy()[ipsp_order]
+
+    epsp_separation, ipsp_separation = np.meshgrid(epsp_separations, ipsp_separations, indexing = 'ij')
+    epsp_separation = epsp_separation.ravel()
+    ipsp_separation = ipsp_separation.ravel()
+
+    n_Ia_mono = np.searchsorted(epsp_latencies, epsp_separation, side = 'left')
+    n_mono    = np.searchsorted(epsp_latencies, epsp_upper,      side = 'right')
+    n_Ib_mono = np.maximum(n_mono - n_Ia_mono, 0)
+    n_Ia_di   = np.searchsorted(ipsp_latencies, ipsp_separation, side = 'left')
+    n_Ib_di   = len(ipsp_latencies) - n_Ia_di
+
+    sweep = pd.DataFrame({'epsp_separation': epsp_separation,
+                          'ipsp_separation': ipsp_separation,
+                          'Ia_mono_epsps':   n_Ia_mono,
+                          'Ib_mono_epsps':   n_Ib_mono,
+                          'Ia_di_ipsps':     n_Ia_di,
+                          'Ib_di_ipsps':     n_Ib_di,
+                          'Ia_psps':         n_Ia_mono + n_Ia_di,
+                          'Ib_psps':         n_Ib_mono + n_Ib_di})
+    return sweep, epsp_order, ipsp_order
+
+def plot_threshold_sweep(sweep, filename, column = 'Ia_psps'):
+    counts = sweep.pivot(index = 'ipsp_separation', columns = 'epsp_separation', values = column)
+
+    fig = plt.figure(figsize = (3, 2.5), dpi = 300)
+    ax = fig.add_subplot(111)
+
+    extent = [counts.columns.min(), counts.columns.max(), counts.index.min(), counts.index.max()]
+    image = ax.imshow(counts.to_numpy(), origin = 'lower', aspect = 'auto', extent = extent, cmap = 'Greys')
+    cbar = fig.colorbar(image, ax = ax)
+    cbar.ax.tick_params(labelsize = 9)
+    cbar.set_label(column, fontsize = 9)
+
+    ax.scatter([dr_epsp_Ia_Ib_seperation[0]], [dr_ipsp_Ia_Ib_seperation[0]], s = 10, color = 'red', zorder = 2)
+    ax.set_xlabel("EPSP Ia/Ib separation [ms]", fontsize = 9)
+    ax.set_ylabel("IPSP Ia/Ib separation [ms]", fontsize = 9)
+    ax.tick_params(axis='both', which='major', labelsize=9)
+
+    fig.savefig(plot_directory + filename + '.pdf', bbox_inches='tight', dpi = 300)
+
+def sweep_latency_thresholds(session = None):
+    if session is None:
+        session = LatencySession()
+
+    sweep, _, _ = latency_threshold_sweep(session, np.arange(0.5, 2.01, 0.05), np.arange(1.0, 4.01, 0.05))
+    with pd.option_context('display.max_rows', None):
+        print(sweep)
+
+    plot_threshold_sweep(sweep, "threshold_sweep_Ia_psps", 'Ia_psps')
+    plot_threshold_sweep(sweep, "threshold_sweep_Ib_psps", 'Ib_psps')
+
+#Loads the synaptology table and the PSPs once. The derived PSP tables are
+#built on first access and shared by all plots and statistics using the session.
+class LatencySession:
+    def __init__(self, synaptology = None):
+        self._synaptology = synaptology
+
+    @cached_property
+    def synaptology(self):
+        if self._synaptology is None:
+            return load_synaptology_index(synaptology_filename)
+        return self._synaptology
+
+    @cached_property
+    def psps(self):
+        return load_PSPs(self.synaptology)
+
+    @property
+    def traces(self):
+        return self.psps.traces
+
+    @cached_property
+    def is_ipsp(self):
+        return self.traces.synaptology < 0
+
+    @cached_property
+    def is_epsp(self):
+        return self.traces.synaptology > 0
+
+    @cached_property
+    def is_dr(self):
+        return self.traces.source.isin(dr_sources)
+
+    @cached_property
+    def is_skin(self):
+        return self.traces.source.isin(skin_sources)
+
+    @cached_property
+    def is_Ia_mono_epsp(self):
+        return self.is_dr & self.is_epsp & (self.traces.avg_latency < dr_epsp_Ia_Ib_seperation[0])
+
+    @cached_property
+    def is_Ib_mono_epsp(self):
+        return self.is_dr & self.is_epsp & \
+               self.traces.avg_latency.between(dr_epsp_Ia_Ib_seperation[0], dr_epsp_latencies[0])
+
+    @cached_property
+    def is_Ia_di_ipsp(self):
+        return self.is_dr & self.is_ipsp & (self.traces.avg_latency <  dr_ipsp_Ia_Ib_seperation[0])
+
+    @cached_property
+    def is_Ib_di_ipsp(self):
+        return self.is_dr & self.is_ipsp & (self.traces.avg_latency >= dr_ipsp_Ia_Ib_seperation[0])
+
+    @cached_property
+    def ipsps(self):
+        return self.psps[self.is_ipsp]
+
+    @cached_property
+    def epsps(self):
+        return self.psps[self.is_epsp]
+
+    @cached_property
+    def dr_psps(self):
+        return self.psps[self.is_dr]
 
+    @cached_property
+    def skin_psps(self):
+        return self.psps[self.is_skin]
 
-def get_PSPs(files, synaptology_file):
-    ret = []
-    for f in files:
-        psp = PSP(f, synaptology_file)
-        if psp.valid:
-            ret.append(psp)
-    return ret
+    @cached_property
+    def dr_ipsps(self):
+        return self.psps[self.is_dr & self.is_ipsp]
+
+    @cached_property
+    def dr_epsps(self):
+        return self.psps[self.is_dr & self.is_epsp]
+
+    @cached_property
+    def skin_ipsps(self):
+        return self.psps[self.is_skin & self.is_ipsp]
+
+    @cached_property
+    def skin_epsps(self):
+        return self.psps[self.is_skin & self.is_epsp]
+
+    @cached_property
+    def Ia_mono_epsps(self):
+        return self.psps[self.is_Ia_mono_epsp]
+
+    @cached_property
+    def Ib_mono_epsps(self):
+        return self.psps[self.is_Ib_mono_epsp]
+
+    @cached_property
+    def Ia_di_ipsps(self):
+        return self.psps[self.is_Ia_di_ipsp]
+
+    @cached_property
+    def Ib_di_ipsps(self):
+        return self.psps[self.is_Ib_di_ipsp]
+
+    @cached_property
+    def Ia_psps(self):
+        return self.psps[self.is_Ia_mono_epsp | self.is_Ia_di_ipsp]
+
+    @cached_property
+    def Ib_psps(self):
+        return self.psps[self.is_Ib_mono_epsp | self.is_Ib_di_ipsp]
+
+    @cached_property
+    def amplitude_drift(self):
+        return amplitude_drift(self.psps)
 
 def get_latencies(psps, synaptology = True, ID = False, filename = False):
-    avg_latencies = []
-    var_latencies = []
-    label_texts = []
-    synaptologies = []
-
-    for psp in psps:
-        if(psp.Skinlatency > 100):
-            continue
-
-        avg_latencies.append(psp.avg_latency)
-
-        var_latencies.append(psp.var_latency)
-
-        label_text = ""#str(psp.stimulation) 
-        #if synaptology:
-        #    label_text += str(np.abs(psp.synaptology))
-        #if ID:
-        #   label_text += " " + str(psp.ID)
-        #if filename:
-        #   label_text += " " + psp.filename
-        label_texts.append(label_text)
-
-        synaptologies.append(psp.synaptology)
- 
+    traces = psps.traces[psps.traces.in_synaptology]
+
+    avg_latencies = traces.avg_latency.to_numpy()
+    var_latencies = traces.var_latency.to_numpy()
+    synaptologies = traces.synaptology.to_numpy()
+
+    label_texts = [""] * len(traces) #str(psp.stimulation)
+    #if synaptology:
+    #    label_text += str(np.abs(psp.synaptology))
+    #if ID:
+    #   label_text += " " + str(psp.ID)
+    #if filename:
+    #   label_text += " " + psp.filename
+
     return avg_latencies, var_latencies, label_texts, synaptologies
 
 
-def plot_latencies(psps, filename, vlines = [], labels = True, title = None):
+#rasterized draws the points as an image inside the PDF, for figures with many points.
+def plot_latencies(psps, filename, vlines = [], labels = True, title = None, rasterized = False):
     avg_latencies, var_latencies, label_texts, synaptologies = get_latencies(psps)
 
     #fig = plt.figure() #figsize=(3,3),dpi=300)
@@ -174,11 +423,10 @@ def plot_latencies(psps, filename, vlines = [], labels = True, title = None):
     #colors = gaussian_kde(xy, bw_method = 0.1)(xy)
     #sns.kdeplot(avg_latencies, var_latencies, ax = ax, bw = 0.1, cmap = 'Reds')
 
-    for l, v, s in zip(avg_latencies, var_latencies, synaptologies):
-        color = 'red' if s < 0 else 'black'
-        ax.scatter(l, v, s = 10, zorder = 2, color = color)
-        if s < 0 and l < 0.2:
-            print(l, v, s)
+    colors = np.where(synaptologies < 0, 'red', 'black')
+    ax.scatter(avg_latencies, var_latencies, s = 10, zorder = 2, color = colors, rasterized = rasterized)
+    for i in np.flatnonzero((synaptologies < 0) & (avg_latencies < 0.2)):
+        print(avg_latencies[i], var_latencies[i], synaptologies[i])
 
     #fig.colorbar(bar)
     
@@ -190,7 +438,7 @@ def plot_latencies(psps, filename, vlines = [], labels = True, title = None):
             ax.text(x, y + 0.1, label, fontsize = 4, rotation = 0)
     
 
-    fig.savefig('./plots_latencies/' + filename + '.pdf', bbox_inches='tight', dpi = 300)
+    fig.savefig(plot_directory + filename + '.pdf', bbox_inches='tight', dpi = 300)
 
 
 def plot_latencies_hist(psps, filename, vlines = [], labels = True, bw = 0.1, color = 'black', title = None):
@@ -208,7 +456,9 @@ def plot_latencies_hist(psps, filename, vlines = [], labels = True, bw = 0.1, co
     ax.tick_params(axis='both', which='major', labelsize=9)
 
 
-    sns.kdeplot(avg_latencies, shade = True, ax = ax, bw = bw, color = color)
+    support, latency_density = density.kde_1d(avg_latencies, bw = bw)
+    ax.plot(support, latency_density, color = color)
+    ax.fill_between(support, 0, latency_density, color = color, alpha = 0.25, linewidth = 0)
 
     random_offset = []
     for _ in avg_latencies:
@@ -227,15 +477,12 @@ def plot_latencies_hist(psps, filename, vlines = [], labels = True, bw = 0.1, co
     for x, linestyle in vlines:
         ax.axvline(x, linestyle = linestyle)
 
-    fig.savefig('./plots_latencies/hist_' + filename + '.pdf', bbox_inches='tight', dpi = 300)
+    fig.savefig(plot_directory + 'hist_' + filename + '.pdf', bbox_inches='tight', dpi = 300)
     
 
-def generate_latency_plots():
-    files = glob.glob('./data_raw/' + '/**/*.dat', recursive=True)
-    
-    synaptology_file = pd.read_csv("./data_synaptology/Synaptology_HQ_tidy.csv")
-    #print(synaptology_file)
-    psps = get_PSPs(files, synaptology_file)
+def figure_jobs(session = None):
+    if session is None:
+        session = LatencySession()
 
     sources = set()
 
@@ -246,33 +493,14 @@ def generate_latency_plots():
     #    i += 1
     #print(sources)
 
-    ipsp_filter = lambda l: filter(lambda psp: psp.synaptology < 0, l)
-    epsp_filter = lambda l: filter(lambda psp: psp.synaptology > 0, l)
-    dr_filter   = lambda l: filter(lambda psp: psp.source in ["dr"], l)    
-    skin_filter = lambda l: filter(lambda psp: psp.source in ["ikns", "rs", "iklnnsu"], l)
-
     #threshold_filter = lambda th, l: filter(lambda psp: psp.stimulation < th, l)
 
-
-    ipsps = list(ipsp_filter(psps))
-    epsps = list(epsp_filter(psps))
-
-    dr_ipsps   = list(dr_filter(  ipsp_filter(psps)))
-    dr_epsps   = list(dr_filter(  epsp_filter(psps)))
-    skin_ipsps = list(skin_filter(ipsp_filter(psps)))
-    skin_epsps = list(skin_filter(epsp_filter(psps)))
-
-    dr_psps    = list(dr_filter(psps))
-    skin_psps  = list(skin_filter(psps))
-
-    Ia_mono_epsps = list(filter(lambda psp: psp.avg_latency < dr_epsp_Ia_Ib_seperation[0]                          , dr_epsps))
-    Ib_mono_epsps = list(filter(lambda psp: dr_epsp_Ia_Ib_seperation[0] <= psp.avg_latency <= dr_epsp_latencies[0] , dr_epsps))
-
-    Ia_di_ipsps = list(filter(lambda psp: psp.avg_latency <  dr_ipsp_Ia_Ib_seperation[0] , dr_ipsps))
-    Ib_di_ipsps = list(filter(lambda psp: dr_ipsp_Ia_Ib_seperation[0] <= psp.avg_latency , dr_ipsps))
-
-    Ia_psps = Ia_mono_epsps + Ia_di_ipsps
-    Ib_psps = Ib_mono_epsps + Ib_di_ipsps
+    dr_psps    = session.dr_psps
+    skin_psps  = session.skin_psps
+    dr_ipsps   = session.dr_ipsps
+    dr_epsps   = session.dr_epsps
+    skin_ipsps = session.skin_ipsps
+    skin_epsps = session.skin_epsps
 
     #plot_latencies(skin_ipsps, "avg_var_skin_ipsps_labeled")
     #plot_latencies(skin_epsps, "avg_var_skin_epsps_labeled")
@@ -284,22 +512,28 @@ def generate_latency_plots():
     #plot_latencies(dr_ipsps,   "avg_var_dr_ipsps",   labels = True)
     #plot_latencies(dr_epsps,   "avg_var_dr_epsps",   labels = True)
 
-    plot_latencies(dr_psps,    "avg_var_dr_psps",    labels = True, title = "DR PSPs")
-    plot_latencies(skin_psps,  "avg_var_skin_psps",  labels = True, title = "Skin PSPs")
+    scatter = lambda psps, filename, **kwargs: \
+        render.job(plot_directory + filename + '.pdf', plot_latencies, psps, filename, **kwargs)
+    hist = lambda psps, filename, **kwargs: \
+        render.job(plot_directory + 'hist_' + filename + '.pdf', plot_latencies_hist, psps, filename, **kwargs)
+
+    jobs = [
+        scatter(dr_psps,    "avg_var_dr_psps",    labels = True, title = "DR PSPs"),
+        scatter(skin_psps,  "avg_var_skin_psps",  labels = True, title = "Skin PSPs"),
 
-    plot_latencies_hist(skin_ipsps, "skin_ipsps", vlines = list(it.product(skin_ipsp_latencies, ['solid'])),
-                        labels = False, bw = 0.2, color = 'red', title = 'Skin IPSPs')
+        hist(skin_ipsps, "skin_ipsps", vlines = list(it.product(skin_ipsp_latencies, ['solid'])),
+             labels = False, bw = 0.2, color = 'red', title = 'Skin IPSPs'),
 
-    plot_latencies_hist(skin_epsps, "skin_epsps", vlines = list(it.product(skin_epsp_latencies, ['solid'])),
-                        labels = False, bw = 0.2, color = 'black',   title = 'Skin EPSPs')
+        hist(skin_epsps, "skin_epsps", vlines = list(it.product(skin_epsp_latencies, ['solid'])),
+             labels = False, bw = 0.2, color = 'black',   title = 'Skin EPSPs'),
 
-    plot_latencies_hist(dr_ipsps,   "dr_ipsps",   vlines = list(it.product(dr_ipsp_latencies, ['-']))
-                                                         + list(it.product(dr_ipsp_Ia_Ib_seperation, ['--'])),
-                        labels = False, bw = 0.2, color = 'red', title = 'DR IPSPs')
+        hist(dr_ipsps,   "dr_ipsps",   vlines = list(it.product(dr_ipsp_latencies, ['-']))
+                                              + list(it.product(dr_ipsp_Ia_Ib_seperation, ['--'])),
+             labels = False, bw = 0.2, color = 'red', title = 'DR IPSPs'),
 
-    plot_latencies_hist(dr_epsps,   "dr_epsps",   vlines = list(it.product(dr_epsp_latencies, ['-']))
-                                                         + list(it.product(dr_epsp_Ia_Ib_seperation, ['--'])),
-                        labels = False, bw = 0.1, color = 'black',   title = 'DR EPSPs')
+        hist(dr_epsps,   "dr_epsps",   vlines = list(it.product(dr_epsp_latencies, ['-']))
+                                              + list(it.product(dr_epsp_Ia_Ib_seperation, ['--'])),
+             labels = False, bw = 0.1, color = 'black',   title = 'DR EPSPs')]
 
     #plot_latencies_hist(skin_ipsps, "skin_ipsps_labeled", labels = True, bw = 0.2, color = 'black', title = 'Skin IPSPs')
     #plot_latencies_hist(skin_epsps, "skin_epsps_labeled", labels = True, bw = 0.2, color = 'red',   title = 'Skin EPSPs')
@@ -314,52 +548,33 @@ def generate_latency_plots():
     #plot_latencies(Ia_psps, "Ia_psps", labels = True)
     #plot_latencies(Ib_psps, "Ib_psps", labels = True)
 
+    return jobs
 
-def analyze_amplitudes():
-    files = glob.glob('./data_raw/' + '/**/*.dat', recursive=True)
-    
-    synaptology_file = pd.read_csv("./data_synaptology/Synaptology_HQ_tidy.csv")
-    #print(synaptology_file)
-    psps = get_PSPs(files, synaptology_file)
-
-    slopes = []
-    cvs = []
-    supports = []
-    support_neurons = []
-    support_source = []
-
-    for psp in psps:
-        support = len(psp.amplitude)
-        if support < 20:
-            continue
 
-        if psp.synaptology != 1:
-            continue
+def generate_latency_plots(session = None, n_processes = render.n_processes):
+    return render.render(figure_jobs(session), n_processes)
 
-        x = range(len(psp.amplitude))
-        amp = psp.amplitude
-        result = np.polyfit(x, amp, 1)
-        slope = result[0]
-        #print(result)
 
-        if slope > 0.20:
-            print("excessive slope", psp)
+def analyze_amplitudes(session = None):
+    if session is None:
+        session = LatencySession()
 
-        slopes.append(slope)
+    psps = session.amplitude_drift
+    traces = psps.traces
 
-        cv = variation(amp)
+    for i in np.flatnonzero(traces.excessive_slope):
+        print("excessive slope", psps.describe(i))
 
-        if cv > 0.30:
-            print(psp)
-            print(psp.amplitude)
+    for i in np.flatnonzero(traces.excessive_cv):
+        print(psps.describe(i))
+        print(psps.samples(i)[1])
 
+    slopes = traces.slope.to_numpy()
+    cvs = traces.cv.to_numpy()
 
-        cvs.append(cv)
-
-        supports.append(support)
-        if(psp.ID not in support_neurons):
-            support_neurons.append(psp.ID)
-        support_source.append(psp.source)
+    supports = list(traces.length)
+    support_neurons = list(pd.unique(traces.ID))
+    support_source = list(traces.source)
 
     slope_mean = np.mean(slopes)
     slope_cv = variation(slopes)
@@ -392,6 +607,72 @@ def analyze_amplitudes():
     print("Number of support neurons", len(support_neurons))
     print(support_source)
 
+#Bootstrap confidence intervals of the average latency of the PSP groups and of
+#the EPSP - IPSP differences with permutation p-values, and of the mean slope and
+#coefficient of variation of the amplitude drift.
+def resample_latency_statistics(session = None, n_replicates = 10000, seed = 0, n_processes = 1, level = 0.95):
+    if session is None:
+        session = LatencySession()
+
+    def latencies(psps):
+        return get_latencies(psps)[0]
+
+    #Groups can be empty for other thresholds, their rows are nan.
+    def average(values):
+        return np.mean(values) if len(values) > 0 else np.nan
+
+    groups = {'dr_epsps':      session.dr_epsps,
+              'dr_ipsps':      session.dr_ipsps,
+              'skin_epsps':    session.skin_epsps,
+              'skin_ipsps':    session.skin_ipsps,
+              'Ia_mono_epsps': session.Ia_mono_epsps,
+              'Ib_mono_epsps': session.Ib_mono_epsps,
+              'Ia_di_ipsps':   session.Ia_di_ipsps,
+              'Ib_di_ipsps':   session.Ib_di_ipsps}
+    differences = {'dr_epsps - dr_ipsps':     (session.dr_epsps,   session.dr_ipsps),
+                   'skin_epsps - skin_ipsps': (session.skin_epsps, session.skin_ipsps)}
+    drift = session.amplitude_drift.traces
+
+    #Every statistic gets its own random stream spawned from the seed.
+    n_statistics = len(groups) + 2 * len(differences) + 2
+    seeds = iter(np.random.SeedSequence(seed).spawn(n_statistics))
+    options = dict(n_replicates = n_replicates, n_processes = n_processes)
+    rows = []
+
+    def add_row(name, n, estimate, replicates, p = np.nan):
+        low, high = resampling.confidence_interval(replicates, level)
+        rows.append({'statistic': name, 'n': n, 'estimate': estimate, 'ci_low': low, 'ci_high': high, 'p': p})
+
+    for name, psps in groups.items():
+        values = latencies(psps)
+        add_row('latency ' + name, len(values), average(values), resampling.bootstrap(values, seed = next(seeds), **options))
+
+    for name, (a, b) in differences.items():
+        a, b = latencies(a), latencies(b)
+        add_row('latency ' + name, len(a) + len(b), average(a) - average(b),
+                resampling.bootstrap_difference(a, b, seed = next(seeds), **options),
+                resampling.permutation_test(a, b, seed = next(seeds), **options))
+
+    for column in ['slope', 'cv']:
+        values = drift[column].to_numpy()
+        add_row('amplitude ' + column, len(values), average(values),
+                resampling.bootstrap(values, seed = next(seeds), **options))
+
+    return pd.DataFrame(rows)
+
+def main():
+    import plot_latencies
+    session = plot_latencies.LatencySession()
+    if '--sweep' in sys.argv:
+        plot_latencies.sweep_latency_thresholds(session)
+    elif '--resample' in sys.argv:
+        with pd.option_context('display.max_columns', None, 'display.width', None):
+            print(plot_latencies.resample_latency_statistics(session, n_processes = n_processes))
+    else:
+        results = plot_latencies.generate_latency_plots(session)
+        plot_latencies.analyze_amplitudes(session)
+        render.exit_if_failed(results)
+
+
 if __name__ == '__main__':
-    generate_latency_plots()
-    analyze_amplitudes()
+    main()
@@ -3,9 +3,10 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import re
-import pandas as pd
 
 import plot_style
+import render
+from rule_tables import open_rules
 
 def plot_table(table, filename):
     original_value = table[table.original == "T"].Value.values[0]
@@ -23,6 +24,16 @@ def plot_table(table, filename):
     fig.tight_layout()
     fig.savefig('./plots_loops/' + filename + '.pdf', dpi = 300)
 
-ExEx_table = pd.read_csv("./results_loops/ExEx.csv", encoding = 'utf8')
+def figure_jobs():
+    ExEx_table = open_rules("./results_loops/ExEx.csv")['', '']
 
-plot_table(ExEx_table, "ExEx")
+    return [render.job('./plots_loops/ExEx.pdf', plot_table, ExEx_table, "ExEx")]
+
+
+def main():
+    import plot_loops
+    render.exit_if_failed(render.render(plot_loops.figure_jobs()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,20 @@
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
-import pandas as pd
 import scipy
 from scipy.stats import kde
 import seaborn as sns
 import matplotlib.colors
 import random as rnd
+
+import density
+import render
+from synaptology import load_synaptology
+
 sns.set_style("white")
 
 
-def plot_2d_contour(ax, x, y, x_label, y_label):
+def plot_2d_contour(ax, x, y, x_label, y_label, rasterized = False):
     x = np.abs(x)
     y = np.abs(y)
     if x_label == 'Ia - In' and y_label == 'Ib - In':
@@ -36,14 +40,15 @@ def plot_2d_contour(ax, x, y, x_label, y_label):
 
     cmap = matplotlib.colors.LinearSegmentedColormap.from_list("", ["white", "red"])
 
-    sns.kdeplot(x, y, cmap = cmap, shade = True, shade_lowest = False, ax = ax)
+    xs, ys, xy_density = density.kde_2d(x, y)
+    if xy_density.size > 0:
+        ax.contourf(xs, ys, xy_density, levels = density.isoproportion_levels(xy_density), cmap = cmap)
 
     min_rnd = -0.5
     max_rnd = 0.5
     #dist = rnd.uniform(0, max_rnd)
-    offset = lambda v : v if v == 0 else v + np.random.uniform(min_rnd, max_rnd)
-    for a, b in zip(x,y):
-        ax.scatter(offset(a), offset(b), s = 3, color = 'C0')
+    offset = lambda v : np.where(v == 0, v, v + np.random.uniform(min_rnd, max_rnd, len(v)))
+    ax.scatter(offset(x), offset(y), s = 3, color = 'C0', rasterized = rasterized)
 
     sns.despine()
     ax.spines['bottom'].set_visible(False)
@@ -53,59 +58,51 @@ def plot_2d_contour(ax, x, y, x_label, y_label):
     ax.set_xlabel(x_label, labelpad = -6, fontsize = 9)
     ax.set_ylabel(y_label, labelpad = -6, fontsize = 9)
 
-def plot_all_2d_contour(data, output):
-    plt.gcf().subplots_adjust(bottom=0.30)
-    plt.gcf().subplots_adjust(left=0.25)
+contour_pairs = [('Ia1',  'Ia-2',  'Ia - Ex', 'Ia - In'),
+                 ('Ib1',  'Ib-2',  'Ib - Ex', 'Ib - In'),
+                 ('Ia1',  'Ib1',   'Ia - Ex', 'Ib - Ex'),
+                 ('Ia-2', 'Ib-2',  'Ia - In', 'Ib - In'),
+                 ('Ia1',  'Skin1', 'Ia - Ex', 'Skin - Ex'),
+                 ('Ib1',  'Skin1', 'Ib - Ex', 'Skin - Ex')]
+                 #('Skin1', 'Skin-2', 'Skin - Ex', 'Skin - In')]
 
-    xy = [('Ia1',  'Ia-2',  'Ia - Ex', 'Ia - In'),
-      ('Ib1',  'Ib-2',  'Ib - Ex', 'Ib - In'),
-      ('Ia1',  'Ib1',   'Ia - Ex', 'Ib - Ex'),
-      ('Ia-2', 'Ib-2',  'Ia - In', 'Ib - In'),
-      ('Ia1',  'Skin1', 'Ia - Ex', 'Skin - Ex'),
-      ('Ib1',  'Skin1', 'Ib - Ex', 'Skin - Ex')]
-      #('Skin1', 'Skin-2', 'Skin - Ex', 'Skin - In')]
 
+def plot_2d_contour_figure(x_values, y_values, x, y, x_label, y_label, output):
+    fig, ax = plt.subplots()
+    fig.set_figheight(1.7)
+    fig.set_figwidth(1.7) 
+
+    plot_2d_contour(ax, x_values, y_values, x_label, y_label)
+    
+    fig.tight_layout()
+    fig.savefig(output + x + '_' + y + '.png', dpi = 300, transparent = True)
 
-    for x, y, x_label, y_label in xy:
-        fig, ax = plt.subplots()
-        fig.set_figheight(1.7)
-        fig.set_figwidth(1.7) 
 
-        plot_2d_contour(ax, data[x] / 10, data[y] / 10, x_label, y_label)
-        
-        fig.tight_layout()
-        fig.savefig(output + x + '_' + y + '.png', dpi = 300, transparent = True)
+def plot_all_2d_contour(data, output):
+    for x, y, x_label, y_label in contour_pairs:
+        plot_2d_contour_figure(data[x] / 10, data[y] / 10, x, y, x_label, y_label, output)
 
 
 def plot_weight_distribution(data, output):
-    weights_In = []
-    weights_Ex = []
     inputs = ['Skin', 'Ia', 'Ib']
 
-    for c in data.columns:
-        if not any(map(lambda i: i in c, inputs)):
-            continue
-        for index, row in data.iterrows():
-            w = row[c] / 10
-            if w < 0:
-                weights_In.append(w)
-            elif w > 0:
-                weights_Ex.append(w)
+    _, weights = data.select(inputs)
+    weights = weights.T.ravel() / 10
+    weights_In = weights[weights < 0]
+    weights_Ex = weights[weights > 0]
 
     bw = 0.5
     
     fig = plt.figure(figsize=(3,3),dpi=300)
     ax = fig.add_subplot(111)
     
-    sns.kdeplot(weights_Ex, ax = ax, shade=False, color="black",   bw = bw, clip = (0.0, 10.0))
-    sns.kdeplot(weights_In, ax = ax, shade=False, color="red", bw = bw, clip = (-10.0, 0.0))
+    ax.plot(*density.kde_1d(weights_Ex, bw = bw, clip = (0.0, 10.0)), color = "black")
+    ax.plot(*density.kde_1d(weights_In, bw = bw, clip = (-10.0, 0.0)), color = "red")
     
     min_rnd = 0.0
     max_rnd = 0.1
-    for w in weights_In:
-        ax.scatter(w + np.random.uniform(-0.5, 0.5), np.random.uniform(min_rnd, max_rnd), s = 2, color = "red") 
-    for w in weights_Ex:
-        ax.scatter(w + np.random.uniform(-0.5, 0.5), np.random.uniform(min_rnd, max_rnd), s = 2, color = "black") 
+    for w, color in [(weights_In, "red"), (weights_Ex, "black")]:
+        ax.scatter(w + np.random.uniform(-0.5, 0.5, len(w)), np.random.uniform(min_rnd, max_rnd, len(w)), s = 2, color = color)
 
     
     sns.despine()
@@ -120,7 +117,6 @@ def plot_weight_distribution(data, output):
     print("Number of in weights", len(weights_In))
 
 def plot_depths(data, output):
-    data = pd.read_csv("./data_synaptology/Synaptology_tidy.csv", encoding = 'utf8')
     fig, ax = plt.subplots()
     fig.set_figheight(6)
     fig.set_figwidth(0.2) 
@@ -156,14 +152,23 @@ def plot_depths(data, output):
     fig.savefig(output + 'Depths.png', dpi = 300, bbox_inches='tight', transparent = True) 
     
 
-def main():
+def figure_jobs():
     #dataFile = "../TidyData/tidyDataWeighted.csv"
-    data = pd.read_csv("./data_synaptology/Synaptology_HQ_tidy.csv", encoding = 'utf8')
+    data = load_synaptology("./data_synaptology/Synaptology_HQ_tidy.csv")
     output = "./plots_weights/"
 
-    plot_weight_distribution(data, output)
-    plot_all_2d_contour(data,output)
-    plot_depths(data, output)
+    jobs = [render.job(output + 'Weight_Distribution.png', plot_weight_distribution, data, output)]
+    for x, y, x_label, y_label in contour_pairs:
+        jobs.append(render.job(output + x + '_' + y + '.png', plot_2d_contour_figure,
+                               data[x] / 10, data[y] / 10, x, y, x_label, y_label, output))
+    depth_data = load_synaptology("./data_synaptology/Synaptology_tidy.csv")
+    jobs.append(render.job(output + 'Depths.png', plot_depths, depth_data, output))
+    return jobs
+
+
+def main():
+    import plot_weights
+    render.exit_if_failed(render.render(plot_weights.figure_jobs()))
 
 
 if __name__ == "__main__":
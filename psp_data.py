@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import glob
+import pickle
+import hashlib
+import inspect
+import numpy  as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+p = re.compile('[a-zA-Z0-9/\-\_\.]+/([a-zA-Z0-9]+)\_([a-zA-Z0-9]+)\_([a-zA-Z]+)([0-9]+)\_([\-+][1-4])\_ampl\_([0-9]+)\.dat')
+
+raw_directory     = './data_raw/'
+archive_directory = './data_packed/'
+cache_file        = './data_cache/traces.pkl'
+
+attributes = ['ID', 'description', 'source', 'stimulation', 'synaptology', 'amp']
+
+
+def decompose_filename(f, report = True):
+    m = p.match(f)
+
+    if m is None:
+        if report:
+            print('No match: ', f)
+        return None
+
+    return {'ID':          m.group(1),
+            'description': m.group(2).lower(),
+            'source':      ''.join(sorted(m.group(3).lower())),
+            'stimulation': int(m.group(4)),
+            'synaptology': int(m.group(5)),
+            'amp':         int(m.group(6))}
+
+
+def raw_files(directory = raw_directory):
+    return glob.glob(directory + '/**/*.dat', recursive=True)
+
+
+#Returns latencies and amplitudes of the responses in a trace file or None if
+#the file has an unknown column layout.
+def read_samples(filename):
+    f = np.loadtxt(filename, dtype = float, delimiter = ',', ndmin = 2)
+
+    if f.shape[1] == 3:
+        f = f[f[:,0] > 0]
+        return f[:,0], f[:,1]
+    elif f.shape[1] == 4:
+        f = f[f[:,1] > 0]
+        return f[:,1], f[:,2]
+    else:
+        return None
+
+
+#Decodes and parses one trace file. Returns the filename, the file attributes,
+#the samples and an error message, only plain dicts and arrays so it is cheap
+#to send back from a worker process.
+def read_trace(filename):
+    file_attributes = decompose_filename(filename, report = False)
+    if file_attributes is None:
+        return filename, None, None, 'No match'
+
+    samples = read_samples(filename)
+    if samples is None:
+        return filename, file_attributes, None, 'Unexpected number of columns'
+
+    return filename, file_attributes, samples, None
+
+
+def read_trace_results(files, n_processes = 1):
+    if n_processes == 1:
+        return list(map(read_trace, files))
+
+    with ProcessPoolExecutor(max_workers = n_processes) as pool:
+        return list(pool.map(read_trace, files, chunksize = 16))
+
+
+def collect_traces(results):
+    traces = []
+    failures = []
+    for filename, file_attributes, samples, error in results:
+        if error is None:
+            traces.append((filename, file_attributes, samples))
+        else:
+            failures.append((filename, error))
+
+    for filename, error in failures:
+        print(error + ': ', filename)
+
+    return traces
+
+
+#Reads the trace files in order on n_processes worker processes. Files that
+#could not be read are reported together at the end.
+def read_traces(files, n_processes = 1):
+    return collect_traces(read_trace_results(files, n_processes))
+
+
+def file_stat(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+#Hash of the filename pattern and the parsing code. Cached traces parsed by a
+#different version of the parser are discarded.
+def parser_version():
+    h = hashlib.sha256(p.pattern.encode('utf8'))
+    for function in [decompose_filename, read_samples, read_trace]:
+        h.update(inspect.getsource(function).encode('utf8'))
+    return h.hexdigest()
+
+
+#Cached traces or an empty cache if the file is missing, unreadable or was
+#written by another parser version.
+def load_cache(filename, version = None):
+    try:
+        with open(filename, 'rb') as f:
+            cache = pickle.load(f)
+        if cache['parser'] != (parser_version() if version is None else version) or \
+           not isinstance(cache['traces'], dict):
+            return {}
+        return cache['traces']
+    except Exception:
+        return {}
+
+
+#Like read_traces, but results are kept in a cache file keyed by file path,
+#modification time and size. Only new or changed files are parsed again, entries
+#of files that are gone or changed are dropped when the cache is written back.
+def read_traces_cached(files, n_processes = 1, filename = cache_file):
+    version = parser_version()
+    cache = load_cache(filename, version)
+    stats = {f: file_stat(f) for f in files}
+
+    stale = [f for f in files if f not in cache or cache[f][0] != stats[f]]
+    fresh = dict(zip(stale, read_trace_results(stale, n_processes)))
+
+    updated = {f: (stats[f], fresh[f] if f in fresh else cache[f][1]) for f in files}
+    if len(stale) > 0 or updated.keys() != cache.keys():
+        os.makedirs(os.path.dirname(filename), exist_ok = True)
+        with open(filename, 'wb') as f:
+            pickle.dump({'parser': version, 'traces': updated}, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    return collect_traces([updated[f][1] for f in files])
+
+
+#The archive holds the samples of all traces in one (n_samples, 2) array of
+#latency and amplitude, the index table locates each trace by offset and length.
+#files.csv records modification time and size of every packed file.
+def pack(files, directory = archive_directory, n_processes = None):
+    index   = []
+    samples = []
+    offset  = 0
+    for f, file_attributes, (latencies, amplitude) in read_traces(files, n_processes):
+        index.append(dict(file_attributes, filename = f, offset = offset, length = len(latencies)))
+        samples.append(np.column_stack([latencies, amplitude]))
+        offset += len(latencies)
+
+    os.makedirs(directory, exist_ok = True)
+    np.save(os.path.join(directory, 'samples.npy'), np.concatenate(samples))
+    pd.DataFrame(index).to_csv(os.path.join(directory, 'index.csv'), index = False)
+    pd.DataFrame([(os.path.normpath(f),) + file_stat(f) for f in files],
+                 columns = ['filename', 'mtime_ns', 'size']).to_csv(os.path.join(directory, 'files.csv'), index = False)
+
+
+def archive_exists(directory = archive_directory):
+    return os.path.exists(os.path.join(directory, 'index.csv'))
+
+
+#True if the archive was packed from exactly these files in their current state.
+#Without raw files the archive is the only copy of the data and always current.
+def archive_is_current(files, directory = archive_directory):
+    if len(files) == 0:
+        return True
+    try:
+        packed = pd.read_csv(os.path.join(directory, 'files.csv'), encoding = 'utf8', dtype = {'filename': str})
+    except OSError:
+        return False
+
+    packed = {f: (m, s) for f, m, s in zip(packed.filename, packed.mtime_ns, packed['size'])}
+    return packed == {os.path.normpath(f): file_stat(f) for f in files}
+
+
+def load(directory = archive_directory):
+    index   = pd.read_csv(os.path.join(directory, 'index.csv'), encoding = 'utf8', keep_default_na = False,
+                          dtype = {'ID': str, 'description': str, 'source': str, 'filename': str})
+    samples = np.load(os.path.join(directory, 'samples.npy'), mmap_mode = 'r')
+    return index, samples
+
+
+def trace(samples, offset, length):
+    return samples[offset:offset + length, 0], samples[offset:offset + length, 1]
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else raw_directory
+    output    = sys.argv[2] if len(sys.argv) > 2 else archive_directory
+
+    files = sorted(raw_files(directory))
+    pack(files, output)
+    print('Packed', len(files), 'files into', output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,95 @@
 #!/usr/bin/env python3
 
+import os
+import sys
+import numpy  as np
 import pandas as pd
 
-data = pd.read_csv('./data_synaptology/Synaptology_tidy.csv')
+from synaptology import load_synaptology
 
-print(data)
+usage = \
+"""Usage:
+reduce_data.py
+reduce_data.py spec.csv data_tidy.csv [data_tidy.csv ...]
 
-reduced_data = pd.DataFrame()
+spec.csv has the columns column,modality,lengths, e.g. Skin1,Skin,1;2;3;4"""
 
-reduced_data['ID']     = data['ID']
-reduced_data['Skin-2'] =                  data['Skin-2'] | data['Skin-3'] | data['Skin-4']
-reduced_data['Skin1']  = data['Skin1']  | data['Skin2']  | data['Skin3']  | data['Skin4']
-reduced_data['Ia-2']   =                  data['Ia-2']   | data['Ia-3']   | data['Ia-4'] 
-reduced_data['Ia1']    = data['Ia1']    | data['Ia2']    | data['Ia3']    | data['Ia4']
-reduced_data['Ib-2']   =                  data['Ib-2']   | data['Ib-3']   | data['Ib-4'] 
-reduced_data['Ib1']    = data['Ib1']    | data['Ib2']    | data['Ib3']    | data['Ib4']
+#Output column, modality and the synaptic lengths that are folded into it.
+reduction_spec = [('Skin-2', 'Skin', [-2, -3, -4]),
+                  ('Skin1',  'Skin', [1, 2, 3, 4]),
+                  ('Ia-2',   'Ia',   [-2, -3, -4]),
+                  ('Ia1',    'Ia',   [1, 2, 3, 4]),
+                  ('Ib-2',   'Ib',   [-2, -3, -4]),
+                  ('Ib1',    'Ib',   [1, 2, 3, 4])]
 
-reduced_data.to_csv('./data_synaptology/Synaptology_tidy_reduced.csv', index = False)
 
-print(reduced_data)
+def read_spec(filename):
+    spec = pd.read_csv(filename, encoding = 'utf8', dtype = str)
+    return [(c, m, [int(l) for l in lengths.split(';') if len(l) > 0])
+            for c, m, lengths in zip(spec.column, spec.modality, spec.lengths)]
+
+
+def reduction_index(data, spec):
+    order  = []
+    starts = []
+    for column, modality, lengths in spec:
+        group = [data.column_index[modality + str(l)] for l in lengths]
+        if len(group) == 0:
+            print('No synaptic lengths for', column)
+            assert(False)
+        starts.append(len(order))
+        order += group
+    return np.array(order), np.array(starts)
+
+
+#Folds the activation columns group wise. Binary data is ORed, for weights the
+#one with the largest magnitude is kept so inhibitory groups stay negative.
+def reduce_data(data, spec = reduction_spec):
+    order, starts = reduction_index(data, spec)
+    values = data.values(order)
+
+    if data.binary:
+        reduced = np.bitwise_or.reduceat(values, starts, axis = 1)
+    else:
+        largest  = np.maximum.reduceat(values, starts, axis = 1)
+        smallest = np.minimum.reduceat(values, starts, axis = 1)
+        reduced  = np.where(-smallest > largest, smallest, largest)
+
+    reduced_data = pd.DataFrame(reduced, columns = [c for c, _, _ in spec])
+    reduced_data.insert(0, 'ID', data['ID'])
+    return reduced_data
+
+
+def reduce_files(filenames, spec, suffix):
+    ret = []
+    for filename in filenames:
+        output_filename = os.path.splitext(filename)[0] + suffix + '.csv'
+        reduce_data(load_synaptology(filename), spec).to_csv(output_filename, index = False)
+        ret.append(output_filename)
+    return ret
+
+
+def main():
+    if len(sys.argv) == 1:
+        data = load_synaptology('./data_synaptology/Synaptology_tidy.csv')
+        print(data.to_frame())
+
+        reduced_data = reduce_data(data)
+        reduced_data.to_csv('./data_synaptology/Synaptology_tidy_reduced.csv', index = False)
+        print(reduced_data)
+        return
+
+    if len(sys.argv) < 3:
+        print(usage)
+        return
+
+    spec_filename = sys.argv[1]
+    spec = read_spec(spec_filename)
+    suffix = '_' + os.path.splitext(os.path.basename(spec_filename))[0]
+
+    for output_filename in reduce_files(sys.argv[2:], spec, suffix):
+        print(output_filename)
+
+
+if __name__ == "__main__":
+    main()
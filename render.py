@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import types
+import pickle
+import hashlib
+import inspect
+import importlib
+import traceback
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor
+
+#Scripts with a figure_jobs() function, in the order their figures are reported.
+scripts = ['plot_latencies', 'plot_weights', 'plot_clusterability', 'plot_loops', 'plot_association_rules']
+
+n_processes = os.cpu_count()
+
+#Fingerprints of the figures written so far, see render.
+manifest_file = './data_cache/figures.json'
+
+project_directory = os.path.dirname(os.path.abspath(__file__))
+
+
+#A figure job is the output path, the plot function and its arguments. The plot
+#function saves the figure to the path itself, functions and arguments have to
+#be picklable to be sent to the worker processes. Scripts build their jobs
+#through their imported module, so that classes of the arguments pickle the
+#same way whether the script is run directly or through render.py.
+def job(path, function, *args, **kwargs):
+    return path, function, args, kwargs
+
+
+def use_agg():
+    matplotlib.use('Agg')
+
+
+def project_module(module):
+    filename = getattr(module, '__file__', None)
+    return filename is not None and os.path.dirname(os.path.abspath(filename)) == project_directory
+
+
+#Scripts run directly are __main__, they are keyed by the name they are imported under.
+def module_name(module):
+    if module.__name__ == '__main__':
+        return os.path.splitext(os.path.basename(module.__file__))[0]
+    return module.__name__
+
+
+def code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+    return names
+
+
+#Pickled value of a module level variable, its repr if it cannot be pickled.
+def global_value(value):
+    try:
+        return pickle.dumps(value, protocol = 4).hex()
+    except Exception:
+        return repr(value)
+
+
+#Source of the function and of all project functions, classes and modules it
+#refers to, and the values of the other globals it reads (colors, limits, ...).
+def function_sources(function, sources = None):
+    sources = {} if sources is None else sources
+    module = module_name(inspect.getmodule(function))
+    key = module + '.' + function.__qualname__
+    if key in sources:
+        return sources
+    sources[key] = inspect.getsource(function)
+
+    for name in sorted(code_names(function.__code__)):
+        if name not in function.__globals__:
+            continue
+        value = function.__globals__[name]
+        if isinstance(value, types.ModuleType):
+            if project_module(value):
+                sources.setdefault(module_name(value), inspect.getsource(value))
+        elif isinstance(value, (types.FunctionType, type)):
+            if project_module(inspect.getmodule(value)):
+                if isinstance(value, type):
+                    sources.setdefault(module_name(inspect.getmodule(value)) + '.' + value.__qualname__,
+                                       inspect.getsource(value))
+                else:
+                    function_sources(value, sources)
+        else:
+            sources.setdefault(module + '.' + name, global_value(value))
+    return sources
+
+
+#Hash of the plot arguments and of the source of the plot function and the
+#project code it uses. A figure with an unchanged fingerprint is not rendered again.
+def fingerprint(figure_job):
+    path, function, args, kwargs = figure_job
+    h = hashlib.sha256()
+    h.update(path.encode('utf8'))
+    for key, source in sorted(function_sources(function).items()):
+        h.update(key.encode('utf8'))
+        h.update(source.encode('utf8'))
+    h.update(pickle.dumps((args, sorted(kwargs.items())), protocol = 4))
+    return h.hexdigest()
+
+
+def load_manifest(filename = manifest_file):
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, filename = manifest_file):
+    os.makedirs(os.path.dirname(filename), exist_ok = True)
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent = 1, sort_keys = True)
+
+
+def render_job(figure_job):
+    import matplotlib.pyplot as plt
+
+    path, function, args, kwargs = figure_job
+    start = time.perf_counter()
+    try:
+        function(*args, **kwargs)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    plt.close('all')
+    return path, time.perf_counter() - start, error
+
+
+#Renders the figures on n_processes worker processes with the Agg backend and
+#reports the time spent on each figure. Failed figures are reported at the end.
+#With cache figures whose fingerprint matches the manifest and whose file still
+#exists are skipped, the manifest records fingerprint, time and size of each figure.
+def render(jobs, n_processes = n_processes, cache = True):
+    start = time.perf_counter()
+    manifest = load_manifest() if cache else {}
+    fingerprints = [fingerprint(j) for j in jobs]
+
+    stale = [(j, f) for j, f in zip(jobs, fingerprints)
+             if not (j[0] in manifest and manifest[j[0]]['fingerprint'] == f and os.path.exists(j[0]))]
+    stale_jobs = [j for j, _ in stale]
+
+    if len(stale_jobs) == 0:
+        results = []
+    elif n_processes == 1:
+        use_agg()
+        results = list(map(render_job, stale_jobs))
+    else:
+        with ProcessPoolExecutor(max_workers = n_processes, initializer = use_agg) as pool:
+            results = list(pool.map(render_job, stale_jobs))
+
+    for path, seconds, _ in results:
+        print('%8.2f s  %s' % (seconds, path))
+    print('%8.2f s  %d figures, %d unchanged' % (time.perf_counter() - start, len(results), len(jobs) - len(results)))
+
+    for path, _, error in results:
+        if error is not None:
+            print('Failed: ', path)
+            print(error)
+
+    manifest = load_manifest()
+    for (path, seconds, error), (_, f) in zip(results, stale):
+        if error is None and os.path.exists(path):
+            manifest[path] = {'fingerprint': f, 'seconds': seconds, 'size': os.path.getsize(path)}
+    save_manifest(manifest)
+
+    return results
+
+
+#Exits with status 1 if a figure failed, like a plot script that raised did.
+def exit_if_failed(results):
+    if any(error is not None for _, _, error in results):
+        sys.exit(1)
+
+
+def main():
+    cache = '--force' not in sys.argv
+    names = [a for a in sys.argv[1:] if a != '--force']
+    if len(names) == 0:
+        names = scripts
+
+    jobs = []
+    for name in names:
+        jobs += importlib.import_module(name).figure_jobs()
+    exit_if_failed(render(jobs, cache = cache))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+#Replicates are drawn in chunks, each from its own random stream spawned from
+#the seed. Results only depend on the seed and n_replicates, not on how the
+#chunks are spread over processes. The seed is an int or a SeedSequence, e.g.
+#one spawned per statistic so that the statistics use independent streams.
+chunk_size = 1000
+
+#Statistics take a (n_replicates, n) matrix and reduce the last axis. They have
+#to be module level functions to be sent to worker processes.
+def mean(x):
+    return x.mean(axis = -1)
+
+
+def median(x):
+    return np.median(x, axis = -1)
+
+
+def chunks(n_replicates, seed):
+    sizes = [chunk_size] * (n_replicates // chunk_size)
+    if n_replicates % chunk_size > 0:
+        sizes.append(n_replicates % chunk_size)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return list(zip(sizes, seed.spawn(len(sizes))))
+
+
+def run_chunks(function, arguments, n_processes):
+    if n_processes == 1:
+        results = [function(*a) for a in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers = n_processes) as pool:
+            results = list(pool.map(function, *zip(*arguments)))
+    return np.concatenate(results)
+
+
+def bootstrap_chunk(values, statistic, n, seed):
+    rng = np.random.default_rng(seed)
+    return statistic(values[rng.integers(0, len(values), (n, len(values)))])
+
+
+def bootstrap_difference_chunk(a, b, statistic, n, seed):
+    rng = np.random.default_rng(seed)
+    return statistic(a[rng.integers(0, len(a), (n, len(a)))]) - \
+           statistic(b[rng.integers(0, len(b), (n, len(b)))])
+
+
+def permutation_chunk(a, b, statistic, n, seed):
+    rng = np.random.default_rng(seed)
+    pooled = np.concatenate([a, b])
+    permuted = pooled[rng.permuted(np.tile(np.arange(len(pooled)), (n, 1)), axis = 1)]
+    return statistic(permuted[:, :len(a)]) - statistic(permuted[:, len(a):])
+
+
+#Replicates of an empty sample are nan, there is nothing to resample.
+def bootstrap(values, statistic = mean, n_replicates = 10000, seed = 0, n_processes = 1):
+    values = np.asarray(values, dtype = np.float64)
+    if len(values) == 0:
+        return np.full(n_replicates, np.nan)
+    arguments = [(values, statistic, n, s) for n, s in chunks(n_replicates, seed)]
+    return run_chunks(bootstrap_chunk, arguments, n_processes)
+
+
+def bootstrap_difference(a, b, statistic = mean, n_replicates = 10000, seed = 0, n_processes = 1):
+    a = np.asarray(a, dtype = np.float64)
+    b = np.asarray(b, dtype = np.float64)
+    if len(a) == 0 or len(b) == 0:
+        return np.full(n_replicates, np.nan)
+    arguments = [(a, b, statistic, n, s) for n, s in chunks(n_replicates, seed)]
+    return run_chunks(bootstrap_difference_chunk, arguments, n_processes)
+
+
+#Two sided permutation p-value of statistic(a) - statistic(b).
+def permutation_test(a, b, statistic = mean, n_replicates = 10000, seed = 0, n_processes = 1):
+    a = np.asarray(a, dtype = np.float64)
+    b = np.asarray(b, dtype = np.float64)
+    if len(a) == 0 or len(b) == 0:
+        return np.nan
+    arguments = [(a, b, statistic, n, s) for n, s in chunks(n_replicates, seed)]
+    replicates = run_chunks(permutation_chunk, arguments, n_processes)
+
+    observed = statistic(a) - statistic(b)
+    return (1 + np.sum(np.abs(replicates) >= np.abs(observed))) / (n_replicates + 1)
+
+
+def confidence_interval(replicates, level = 0.95):
+    return tuple(np.quantile(replicates, [(1 - level) / 2, (1 + level) / 2]))
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import numpy  as np
+import pandas as pd
+
+#Result tables written by analysis_core. Every statistic is a block starting
+#with a Name,Value,freq,original header line followed by the frequency of each
+#value in the swap randomized samples. The original row holds the value on the
+#data. Names are "<lhs> => <rhs> p = <p>" for association rules and
+#"p = <p>" for loops, lhs and rhs are empty for the latter.
+header = ['Name', 'Value', 'freq', 'original']
+
+chunksize = 1000000
+
+
+#Splits the names into lhs, rhs and p with vectorized string operations.
+def split_names(names):
+    rule, _, p = names.str.rpartition('p = ').T.to_numpy()
+    lhs, _, rhs = pd.Series(rule).str.rstrip().str.partition(' => ').T.to_numpy()
+    return lhs, rhs, pd.to_numeric(pd.Series(p)).to_numpy()
+
+
+def parse_chunk(chunk):
+    chunk = chunk[chunk.Name != 'Name']
+    l, r, p = split_names(chunk.Name)
+    return pd.DataFrame({'Name':     chunk.Name.to_numpy(),
+                         'Value':    pd.to_numeric(chunk.Value).to_numpy(),
+                         'freq':     pd.to_numeric(chunk.freq).to_numpy(dtype = np.int64),
+                         'original': chunk.original.to_numpy(),
+                         'l':        l,
+                         'r':        r,
+                         'p':        p})
+
+
+#Parsed result table with the rows of each (lhs, rhs) rule in one contiguous
+#slice, rules[lhs, rhs] returns the rows of a rule without scanning the table.
+class RuleTable:
+    def __init__(self, table):
+        keys = pd.MultiIndex.from_arrays([table.l, table.r])
+        codes, uniques = pd.factorize(keys)
+
+        #Blocks of a rule are usually adjacent, only sort if they are not.
+        starts = np.flatnonzero(np.diff(codes, prepend = -1) != 0)
+        if len(starts) != len(uniques):
+            order = np.argsort(codes, kind = 'stable')
+            table = table.iloc[order]
+            codes = codes[order]
+            starts = np.flatnonzero(np.diff(codes, prepend = -1) != 0)
+
+        self.table = table.reset_index(drop = True)
+        stops = np.append(starts[1:], len(codes))
+        self.index = {uniques[c]: slice(start, stop) for c, start, stop in zip(codes[starts], starts, stops)}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, rule):
+        return rule in self.index
+
+    def __getitem__(self, rule):
+        return self.table.iloc[self.index[rule]]
+
+    def rules(self):
+        return list(self.index)
+
+    def lhs(self):
+        return set(l for l, _ in self.index)
+
+
+def read_table(filename, chunksize = chunksize):
+    chunks = pd.read_csv(filename, encoding = 'utf8', dtype = str, chunksize = chunksize)
+    return pd.concat([parse_chunk(c) for c in chunks], ignore_index = True)
+
+
+def load_rules(filename, chunksize = chunksize):
+    return RuleTable(read_table(filename, chunksize))
+
+
+#Rule names with the p-value formatted like std::to_string(double).
+def format_names(l, r, p):
+    p = pd.Series(np.char.mod('%f', np.asarray(p, dtype = np.float64)))
+    rule = pd.Series(l) + ' => ' + pd.Series(r) + ' '
+    rule[pd.Series(l) == ''] = ''
+    return (rule + 'p = ' + p).to_numpy()
+
+
+#Writes the table in the format of analysis_core, a header line before the rows
+#of every rule. Integer values (loop counts) are written as integers.
+def write_table(filename, table):
+    if pd.api.types.is_integer_dtype(table.Value):
+        values = table.Value.astype(str)
+    else:
+        values = pd.Series(np.char.mod('%f', table.Value.to_numpy(dtype = np.float64)))
+
+    rows = (table.Name.reset_index(drop = True) + ',' + values.reset_index(drop = True) + ',' +
+            table.freq.astype(str).reset_index(drop = True) + ',' + table.original.reset_index(drop = True)).to_numpy()
+
+    rules = (table.l + ' => ' + table.r).to_numpy()
+    starts = np.flatnonzero(np.append(True, rules[1:] != rules[:-1]))
+    lines = np.insert(rows.astype(object), starts, ','.join(header))
+
+    with open(filename, 'w', encoding = 'utf8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+#Packed result tables are a directory with the rule dictionary rules.csv (lhs,
+#rhs, p, original value and offset and length of the rows of every rule) and the
+#row columns as raw little endian arrays: ids.bin (int32 rule ids), values.bin
+#(float64) and freqs.bin (uint64). The columns are memory mapped and read one
+#rule at a time, so neither packing nor reading loads the whole table.
+packed_columns = {'ids': '<i4', 'values': '<f8', 'freqs': '<u8'}
+dictionary_columns = ['l', 'r', 'p', 'original', 'integer', 'offset', 'length']
+
+
+def packed_directory(filename):
+    return os.path.splitext(filename)[0] + '_packed'
+
+
+def pack_table(filename, directory = None, chunksize = chunksize):
+    directory = packed_directory(filename) if directory is None else directory
+    os.makedirs(directory, exist_ok = True)
+
+    dictionary = []
+    index = {}
+    offset = 0
+    files = {c: open(os.path.join(directory, c + '.bin'), 'wb') for c in packed_columns}
+    try:
+        for chunk in pd.read_csv(filename, encoding = 'utf8', dtype = str, chunksize = chunksize):
+            integer = not chunk.Value[chunk.Name != 'Name'].str.contains('.', regex = False).any()
+            table = parse_chunk(chunk)
+
+            keys = (table.l + ' => ' + table.r).to_numpy()
+            starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1])) if len(keys) > 0 else []
+            stops = np.append(starts[1:], len(keys))
+            is_original = (table.original == 'T').to_numpy()
+            ids = np.empty(len(table), dtype = packed_columns['ids'])
+
+            for start, stop in zip(starts, stops):
+                key = (table.l.iat[start], table.r.iat[start])
+                if len(dictionary) > 0 and (dictionary[-1]['l'], dictionary[-1]['r']) == key:
+                    rule = dictionary[-1]
+                elif key in index:
+                    print('Rows of rule', key, 'are not contiguous in', filename)
+                    assert(False)
+                else:
+                    index[key] = len(dictionary)
+                    rule = {'l': key[0], 'r': key[1], 'p': table.p.iat[start], 'original': np.nan,
+                            'integer': True, 'offset': offset + start, 'length': 0}
+                    dictionary.append(rule)
+
+                rule['length'] += stop - start
+                rule['integer'] &= integer
+                if is_original[start:stop].any():
+                    rule['original'] = table.Value.iat[start + np.argmax(is_original[start:stop])]
+                ids[start:stop] = index[key]
+
+            ids.tofile(files['ids'])
+            table.Value.to_numpy(dtype = packed_columns['values']).tofile(files['values'])
+            table.freq.to_numpy().astype(packed_columns['freqs']).tofile(files['freqs'])
+            offset += len(table)
+    finally:
+        for f in files.values():
+            f.close()
+
+    pd.DataFrame(dictionary, columns = dictionary_columns).to_csv(os.path.join(directory, 'rules.csv'), index = False)
+    return directory
+
+
+class PackedRules:
+    def __init__(self, directory):
+        self.directory = directory
+        self.dictionary = pd.read_csv(os.path.join(directory, 'rules.csv'), encoding = 'utf8',
+                                      dtype = {'l': str, 'r': str}, keep_default_na = False,
+                                      na_values = {'original': ['']})
+        self.columns = {c: np.memmap(os.path.join(directory, c + '.bin'), dtype = t, mode = 'r')
+                        for c, t in packed_columns.items()}
+        self.index = {rule: i for i, rule in enumerate(zip(self.dictionary.l, self.dictionary.r))}
+
+    #Only the directory and the size and modification time of its files are
+    #pickled, the memory maps are opened again when unpickling.
+    def __getstate__(self):
+        stats = []
+        for f in packed_columns:
+            stat = os.stat(os.path.join(self.directory, f + '.bin'))
+            stats.append((stat.st_size, stat.st_mtime_ns))
+        return self.directory, stats
+
+    def __setstate__(self, state):
+        self.__init__(state[0])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, rule):
+        return rule in self.index
+
+    def __getitem__(self, rule):
+        return self.frame(self.index[rule])
+
+    def rules(self):
+        return list(self.index)
+
+    def lhs(self):
+        return set(l for l, _ in self.index)
+
+    def distribution(self, i):
+        offset, length = self.dictionary.offset.iat[i], self.dictionary.length.iat[i]
+        return self.columns['values'][offset:offset + length], self.columns['freqs'][offset:offset + length]
+
+    #Yields lhs, rhs, p, original value, values and freqs of one rule at a time.
+    def distributions(self):
+        for i, (l, r, p, original) in enumerate(zip(self.dictionary.l, self.dictionary.r,
+                                                    self.dictionary.p, self.dictionary.original)):
+            values, freqs = self.distribution(i)
+            yield l, r, p, original, values, freqs
+
+    #Rows of one rule in the same form as the parsed CSV tables.
+    def frame(self, i):
+        rule = self.dictionary.iloc[i]
+        values, freqs = self.distribution(i)
+        return pd.DataFrame({'Name':     np.repeat(format_names([rule.l], [rule.r], [rule.p]), len(values)),
+                             'Value':    values.astype(np.int64) if rule.integer else np.array(values),
+                             'freq':     freqs.astype(np.int64),
+                             'original': np.where(values == rule.original, 'T', 'F'),
+                             'l':        rule.l,
+                             'r':        rule.r,
+                             'p':        rule.p})
+
+    def to_frame(self):
+        return pd.concat([self.frame(i) for i in range(len(self))], ignore_index = True)
+
+
+#Packed table of a result CSV if it is up to date, the parsed CSV otherwise.
+def open_rules(filename):
+    directory = packed_directory(filename)
+    dictionary = os.path.join(directory, 'rules.csv')
+    if os.path.exists(dictionary) and \
+       (not os.path.exists(filename) or os.path.getmtime(dictionary) >= os.path.getmtime(filename)):
+        return PackedRules(directory)
+    return load_rules(filename)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--pack':
+        for filename in sys.argv[2:]:
+            print(filename, '->', pack_table(filename))
+        return
+
+    for filename in sys.argv[1:]:
+        rules = load_rules(filename)
+        print(filename, len(rules), 'rules', len(rules.table), 'rows')
+
+
+if __name__ == "__main__":
+    main()
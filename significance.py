@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import numpy  as np
+import pandas as pd
+
+from rule_tables import load_rules
+
+usage = \
+"""Usage:
+significance.py [--side core|lower|upper|two-sided] [--method none|bonferroni|sidak|holm|bh] [--alpha 0.05] result.csv [result.csv ...]"""
+
+#Empirical p-values of the original value against the swap randomized
+#frequency distribution of every rule, with freq_smaller, freq_equal and
+#freq_larger counted relative to the original value:
+#core       min(smaller, larger + 1) / (total + 1), frequency_counter::get_p
+#lower      (smaller + equal + 1) / (total + 1)
+#upper      (larger + equal + 1) / (total + 1)
+#two-sided  min(1, 2 min(lower, upper))
+sides   = ['core', 'lower', 'upper', 'two-sided']
+methods = ['none', 'bonferroni', 'sidak', 'holm', 'bh']
+
+
+#Statistics of all rules of all tables in one pass. The rows of each rule are
+#one segment of the concatenated tables, the counts are segment sums.
+def rule_statistics(tables):
+    frames = []
+    keys   = []
+    starts = []
+    offset = 0
+    for name, rules in tables.items():
+        frames.append(rules.table)
+        for (l, r), s in rules.index.items():
+            keys.append((name, l, r))
+            starts.append(offset + s.start)
+        offset += len(rules.table)
+
+    table = pd.concat(frames, ignore_index = True)
+    starts = np.array(starts, dtype = np.int64)
+    lengths = np.diff(np.append(starts, len(table)))
+
+    values      = table.Value.to_numpy()
+    freq        = table.freq.to_numpy(dtype = np.int64)
+    is_original = (table.original == 'T').to_numpy()
+
+    #Rules without a T row never had the original value in the samples, it is unknown then.
+    has_original = np.add.reduceat(is_original, starts) > 0
+    original = np.full(len(starts), np.nan)
+    original[np.repeat(np.arange(len(starts)), lengths)[is_original]] = values[is_original]
+    original_rows = np.repeat(original, lengths)
+
+    total   = np.add.reduceat(freq, starts)
+    smaller = np.add.reduceat(np.where(values < original_rows, freq, 0), starts)
+    larger  = np.add.reduceat(np.where(values > original_rows, freq, 0), starts)
+    equal   = total - smaller - larger
+    mean    = np.add.reduceat(values * freq, starts) / total
+
+    lower = (smaller + equal + 1) / (total + 1)
+    upper = (larger + equal + 1) / (total + 1)
+    statistics = pd.DataFrame({'table':     [k[0] for k in keys],
+                               'l':         [k[1] for k in keys],
+                               'r':         [k[2] for k in keys],
+                               'original':  original,
+                               'mean':      mean,
+                               'total':     total,
+                               'smaller':   smaller,
+                               'equal':     equal,
+                               'larger':    larger,
+                               'stored':    table.p.to_numpy()[starts],
+                               'core':      np.minimum(smaller, larger + 1) / (total + 1),
+                               'lower':     lower,
+                               'upper':     upper,
+                               'two-sided': np.minimum(1, 2 * np.minimum(lower, upper))})
+
+    statistics.loc[~has_original, ['core', 'lower', 'upper', 'two-sided']] = np.nan
+    return statistics
+
+
+#Adjusts the p-values of one family of tests for multiple testing.
+def correct(p, method):
+    p = np.asarray(p, dtype = np.float64)
+    m = len(p)
+    if method == 'none' or m == 0:
+        return p.copy()
+    if method == 'bonferroni':
+        return np.minimum(1, p * m)
+    if method == 'sidak':
+        return 1 - (1 - p) ** m
+
+    order = np.argsort(p, kind = 'stable')
+    ranked = p[order]
+    if method == 'holm':
+        adjusted = np.maximum.accumulate(np.minimum(1, ranked * (m - np.arange(m))))
+    elif method == 'bh':
+        adjusted = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+        adjusted = np.minimum(1, adjusted)
+    else:
+        print('Unknown correction', method)
+        assert(False)
+
+    ret = np.empty(m)
+    ret[order] = adjusted
+    return ret
+
+
+#Adds the adjusted p-value and the significance of every rule. Each table is one
+#family of tests, rules of a modality on itself (l == r) are trivially true and
+#left out like in the rule matrix plot.
+def significance(statistics, side = 'core', method = 'sidak', alpha = 0.05):
+    statistics = statistics.copy()
+    tested = (statistics.l != statistics.r) | (statistics.l == '')
+    tested &= statistics[side].notna()
+
+    statistics['adjusted'] = np.nan
+    for _, family in statistics[tested].groupby('table', sort = False):
+        statistics.loc[family.index, 'adjusted'] = correct(family[side], method)
+    statistics['significant'] = statistics.adjusted <= alpha
+    return statistics
+
+
+def load_tables(filenames):
+    return {os.path.splitext(os.path.basename(f))[0]: load_rules(f) for f in filenames}
+
+
+def main():
+    options = {'--side': 'core', '--method': 'sidak', '--alpha': '0.05'}
+    filenames = []
+    args = iter(sys.argv[1:])
+    for a in args:
+        if a in options:
+            options[a] = next(args)
+        else:
+            filenames.append(a)
+
+    if len(filenames) == 0 or options['--side'] not in sides or options['--method'] not in methods:
+        print(usage)
+        return
+
+    statistics = rule_statistics(load_tables(filenames))
+    statistics = significance(statistics, options['--side'], options['--method'], float(options['--alpha']))
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', None):
+        print(statistics)
+
+
+if __name__ == "__main__":
+    main()
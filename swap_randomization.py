@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import numpy  as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from synaptology import load_synaptology
+
+usage = \
+"""Usage:
+swap_randomization.py data_tidy.csv output_prefix [n_examples [n_swaps [seed]]]
+
+Writes n_examples swap randomized copies of the activations of data_tidy.csv
+to output_prefix_01.csv, ..., n_swaps swaps apart."""
+
+#Modalities used by analysis_core, see reliableModalities in main.cpp.
+reliable_modalities = ['Skin', 'Ia', 'Ib']
+
+#Swaps per sample between the examples of generate_swap_examples in main.cpp.
+n_swaps = 10000
+
+n_processes = os.cpu_count()
+
+#Chains of one worker process and random numbers drawn at once.
+chains_per_shard   = 64
+proposals_per_draw = 100000
+
+
+#Swap randomization of a 0/1 neuron x activation matrix like
+#NeuronSet::swap_in_place. A swap picks two activations (ones) uniformly, (n1, a1)
+#and (n2, a2), and replaces them by (n1, a2) and (n2, a1) if both are zero, so row
+#and column sums stay the same. The sampler runs n_chains chains stacked along
+#the first axis of matrices, every step makes one swap proposal in each chain.
+#A one keeps its row when swapped, only its column is tracked per chain.
+class SwapSampler:
+    def __init__(self, matrix, n_chains = 1, seed = None):
+        matrix = np.asarray(matrix, dtype = bool)
+        self.rng = np.random.default_rng(seed)
+        self.rows, cols = np.nonzero(matrix)
+        self.cols = np.repeat(cols[np.newaxis], n_chains, axis = 0)
+        self.matrices = np.repeat(matrix[np.newaxis], n_chains, axis = 0)
+        self.n_chains = n_chains
+
+    def margins(self):
+        return self.matrices.sum(axis = 2), self.matrices.sum(axis = 1)
+
+    #Makes n_swaps swap proposals in every chain and returns the accepted swaps per chain.
+    def swap(self, n_swaps = n_swaps):
+        accepted = np.zeros(self.n_chains, dtype = np.int64)
+        steps_per_draw = max(1, proposals_per_draw // self.n_chains)
+        for first in range(0, n_swaps, steps_per_draw):
+            proposals = self.rng.integers(0, len(self.rows), (min(steps_per_draw, n_swaps - first), self.n_chains, 2))
+            for ones in proposals:
+                accepted += self.step(ones)
+        return accepted
+
+    def step(self, ones):
+        chains = np.arange(self.n_chains)
+        r1, r2 = self.rows[ones[:, 0]], self.rows[ones[:, 1]]
+        c1, c2 = self.cols[chains, ones[:, 0]], self.cols[chains, ones[:, 1]]
+        valid = ~self.matrices[chains, r1, c2] & ~self.matrices[chains, r2, c1]
+
+        b, r1, r2, c1, c2 = chains[valid], r1[valid], r2[valid], c1[valid], c2[valid]
+        self.matrices[b, r1, c1] = False
+        self.matrices[b, r2, c2] = False
+        self.matrices[b, r1, c2] = True
+        self.matrices[b, r2, c1] = True
+        self.cols[b, ones[valid, 0]] = c2
+        self.cols[b, ones[valid, 1]] = c1
+        return valid
+
+
+#Runs n_chains chains and applies statistic to the stacked states of all chains
+#every n_swaps swaps after burn_in swaps, the states themselves are not kept.
+#Fails like testSwapping if the margins changed.
+def run_chains_in_process(matrix, statistic, n_chains, n_samples, n_swaps = n_swaps, burn_in = n_swaps, seed = None):
+    sampler = SwapSampler(matrix, n_chains, seed)
+    rows, cols = sampler.margins()
+
+    sampler.swap(burn_in)
+    values = []
+    for _ in range(n_samples):
+        sampler.swap(n_swaps)
+        values.append(statistic(sampler.matrices))
+
+    new_rows, new_cols = sampler.margins()
+    if not (np.array_equal(rows, new_rows) and np.array_equal(cols, new_cols)):
+        print('Swapping changed the margins')
+        assert(False)
+    return np.stack(values, axis = 1)
+
+
+#Independent chains seeded from one seed, run in shards of chains_per_shard
+#chains on n_processes worker processes. The results only depend on the seed and
+#the shard size. statistic gets the (chains, neurons, activations) states of a
+#shard and returns one value per chain, it has to be a module level function to
+#be sent to the workers. Returns the statistics with shape (n_chains, n_samples, ...).
+def run_chains(matrix, statistic, n_chains, n_samples, n_swaps = n_swaps, burn_in = n_swaps,
+               seed = None, n_processes = n_processes):
+    shards = [chains_per_shard] * (n_chains // chains_per_shard)
+    if n_chains % chains_per_shard > 0:
+        shards.append(n_chains % chains_per_shard)
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    arguments = [(matrix, statistic, n, n_samples, n_swaps, burn_in, s) for n, s in zip(shards, seeds)]
+
+    if n_processes == 1:
+        return np.concatenate([run_chains_in_process(*a) for a in arguments])
+
+    with ProcessPoolExecutor(max_workers = n_processes) as pool:
+        return np.concatenate(list(pool.map(run_chains_in_process, *zip(*arguments))))
+
+
+#Values and their frequencies, the form of the analysis_core result tables.
+def frequency_table(values):
+    values, freq = np.unique(np.asarray(values), return_counts = True)
+    return pd.DataFrame({'Value': values, 'freq': freq})
+
+
+#Activation matrix of the reliable modalities of a tidy synaptology table.
+def activation_matrix(filename, modalities = reliable_modalities):
+    data = load_synaptology(filename)
+    columns, values = data.select(modalities)
+    return data['ID'], columns, values.astype(bool)
+
+
+#Swapped copies of the matrix n_swaps swaps apart, like generate_swap_examples in main.cpp.
+def swap_examples(matrix, n_examples, n_swaps = n_swaps, seed = None):
+    sampler = SwapSampler(matrix, 1, seed)
+    sampler.swap(n_swaps)
+    examples = []
+    for _ in range(n_examples):
+        examples.append(sampler.matrices[0].copy())
+        sampler.swap(n_swaps)
+    return examples
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(usage)
+        return
+
+    n_examples = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    swaps      = int(sys.argv[4]) if len(sys.argv) > 4 else n_swaps
+    seed       = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+    IDs, columns, matrix = activation_matrix(sys.argv[1])
+    for i, example in enumerate(swap_examples(matrix, n_examples, swaps, seed)):
+        swapped = pd.DataFrame(example.astype(int), columns = columns)
+        swapped.insert(0, 'ID', IDs)
+        filename = '%s_%02d.csv' % (sys.argv[2], i + 1)
+        swapped.to_csv(filename, index = False)
+        print(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import numpy  as np
+import pandas as pd
+
+import convert_data
+
+modalities = convert_data.inputs + convert_data.outputs
+
+activation_pattern = re.compile('^(' + '|'.join(modalities) + ')(-?[0-9])$')
+
+
+def decompose_activation(column):
+    m = activation_pattern.match(column)
+
+    if m is None:
+        return None
+
+    return m.group(1), int(m.group(2))
+
+
+#Tidy synaptology table with the <modality><length> columns stored compactly.
+#Binary tables (tidy noweight, reduced) are bit-packed per neuron, bit j of a row
+#is the activation columns[j]. Weighted tables are stored as int16.
+#All other columns (ID, Depth, Notes, ...) are kept in a small DataFrame.
+class SynaptologyMatrix:
+    def __init__(self, identifiers, columns, values):
+        self.identifiers  = identifiers
+        self.columns      = list(columns)
+        self.column_index = {c: j for j, c in enumerate(self.columns)}
+        self.modalities   = np.array([decompose_activation(c)[0] for c in self.columns])
+        self.lengths      = np.array([decompose_activation(c)[1] for c in self.columns], dtype = np.int8)
+        self.n_neurons    = values.shape[0]
+
+        self.binary = bool(np.isin(values, [0, 1]).all())
+        if self.binary:
+            self.bits    = np.packbits(values.astype(bool), axis = 1, bitorder = 'little')
+            self.weights = None
+        else:
+            self.bits    = None
+            self.weights = values.astype(np.int16)
+
+    @property
+    def shape(self):
+        return self.n_neurons, len(self.identifiers.columns) + len(self.columns)
+
+    @property
+    def nbytes(self):
+        values = self.bits if self.binary else self.weights
+        return values.nbytes + int(self.identifiers.memory_usage(deep = True).sum())
+
+    def __len__(self):
+        return self.n_neurons
+
+    def __getitem__(self, column):
+        if column in self.column_index:
+            return self.values([self.column_index[column]])[:, 0]
+        return self.identifiers[column].to_numpy()
+
+    def column_mask(self, modalities = None, lengths = None):
+        mask = np.ones(len(self.columns), dtype = bool)
+        if modalities is not None:
+            mask &= np.isin(self.modalities, modalities)
+        if lengths is not None:
+            mask &= np.isin(self.lengths, lengths)
+        return mask
+
+    def values(self, columns = None, rows = None):
+        columns = np.arange(len(self.columns)) if columns is None else np.asarray(columns)
+        if columns.dtype == bool:
+            columns = np.flatnonzero(columns)
+        rows = slice(None) if rows is None else rows
+
+        if not self.binary:
+            return self.weights[rows][:, columns]
+
+        bits = self.bits[rows]
+        return (bits[:, columns >> 3] >> (columns & 7).astype(np.uint8)) & 1
+
+    def select(self, modalities = None, lengths = None, rows = None):
+        mask = self.column_mask(modalities, lengths)
+        return [c for c, m in zip(self.columns, mask) if m], self.values(mask, rows)
+
+    def to_frame(self):
+        activations = pd.DataFrame(self.values(), columns = self.columns, index = self.identifiers.index)
+        return pd.concat([self.identifiers, activations], axis = 1)
+
+
+def load_synaptology(filename):
+    header = pd.read_csv(filename, encoding = 'utf8', nrows = 0).columns
+    columns = [c for c in header if decompose_activation(c) is not None]
+
+    data = pd.read_csv(filename, encoding = 'utf8', dtype = {c: np.float32 for c in columns})
+
+    #Weights missing in the source sheet are empty cells, they count as no weight like in the plots.
+    values = data[columns].fillna(0).to_numpy()
+    return SynaptologyMatrix(data.drop(columns = columns), columns, values)
+
+
+#ID to row mapping of a synaptology sheet. For duplicate IDs the first row is used.
+class SynaptologyIndex:
+    def __init__(self, table):
+        self.table = table
+        self.row   = {}
+        for i, ID in enumerate(table.ID):
+            self.row.setdefault(ID, i)
+
+    def __contains__(self, ID):
+        return ID in self.row
+
+    def lookup(self, IDs, column):
+        rows  = pd.Series(IDs, dtype = object).map(self.row).to_numpy(dtype = np.float64)
+        found = ~np.isnan(rows)
+
+        values = np.full(len(rows), np.nan)
+        values[found] = self.table[column].to_numpy(dtype = np.float64)[rows[found].astype(np.int64)]
+        return values, found
+
+    def missing(self, IDs):
+        return sorted(set(ID for ID in IDs if ID not in self.row))
+
+
+def load_synaptology_index(filename):
+    return SynaptologyIndex(pd.read_csv(filename, encoding = 'utf8'))
+
+
+def main():
+    for filename in sys.argv[1:]:
+        data = load_synaptology(filename)
+        print(filename, data.shape, 'binary' if data.binary else 'int16', data.nbytes, 'bytes')
+
+
+if __name__ == "__main__":
+    main()